@@ -0,0 +1,102 @@
+"""
+    Measures how much of the memory of forked workers stays shared with the
+parent process when callbacks are registered before forking, with and
+without freezing the targets first.  Each configuration is run by a fresh
+parent process, forked before any target is built, so heap left over from
+one does not show up in the other.  Frozen targets have their dispatch
+order compiled in the parent rather than in every worker, and calls to them
+don't write to their callbacks, but reading an object still updates its
+reference count, so the pages the workers touch are copied either way.
+Linux only (reads /proc/<pid>/smaps).
+
+usage: python benchmarks/fork_memory.py [num_workers]
+"""
+import gc
+import os
+import sys
+
+from callbacks import supports_callbacks
+
+NUM_TARGETS = 2000
+CALLBACKS_PER_TARGET = 20
+CALLS_PER_TARGET = 20
+
+def callback(*args, **kwargs):
+    pass
+
+def make_target():
+    @supports_callbacks
+    def target(a):
+        return a
+    return target
+
+def memory_kb(pid='self'):
+    totals = {'Shared': 0, 'Private': 0}
+    with open('/proc/%s/smaps' % pid) as f:
+        for line in f:
+            for kind in totals:
+                if line.startswith(kind + '_'):
+                    totals[kind] += int(line.split()[1])
+    return totals
+
+def worker(targets, write_fd):
+    for target in targets:
+        for i in range(CALLS_PER_TARGET):
+            target(i)
+    totals = memory_kb()
+    os.write(write_fd, '%d %d' % (totals['Shared'], totals['Private']))
+    os._exit(0)
+
+def run(num_workers, freeze):
+    targets = [make_target() for i in range(NUM_TARGETS)]
+    for target in targets:
+        for i in range(CALLBACKS_PER_TARGET):
+            target.add_post_callback(callback, label=i, priority=i % 3,
+                    takes_target_args=True)
+        if freeze:
+            target.freeze()
+    gc.collect()
+    if freeze and hasattr(gc, 'freeze'):
+        # keep the collector from writing to the parent's objects (3.7+)
+        gc.freeze()
+
+    results = []
+    for i in range(num_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            worker(targets, write_fd)
+        os.close(write_fd)
+        results.append(map(int, os.read(read_fd, 100).split()))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+    if freeze and hasattr(gc, 'unfreeze'):
+        gc.unfreeze()
+    shared = sum(r[0] for r in results) / len(results)
+    private = sum(r[1] for r in results) / len(results)
+    return shared, private
+
+def run_in_fresh_parent(num_workers, freeze):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, '%d %d' % run(num_workers, freeze))
+        os._exit(0)
+    os.close(write_fd)
+    result = map(int, os.read(read_fd, 100).split())
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return result
+
+if __name__ == '__main__':
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print "%d workers, %d targets with %d callbacks each (KB per worker):" % (
+            num_workers, NUM_TARGETS, CALLBACKS_PER_TARGET)
+    print "  %-10s %10s %10s" % ('', 'shared', 'private')
+    for freeze in (False, True):
+        shared, private = run_in_fresh_parent(num_workers, freeze)
+        print "  %-10s %10d %10d" % (freeze and 'frozen' or 'not frozen',
+                shared, private)
@@ -0,0 +1,30 @@
+"""
+    Measures how long 'from callbacks import supports_callbacks' takes in a
+fresh interpreter, compared to starting an interpreter that imports nothing.
+"""
+import os
+import subprocess
+import sys
+import time
+
+REPEAT = 30
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def best_time(code):
+    env = dict(os.environ, PYTHONPATH=PACKAGE_ROOT)
+    best = None
+    for i in range(REPEAT):
+        started = time.time()
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == '__main__':
+    baseline = best_time('pass')
+    with_import = best_time('from callbacks import supports_callbacks')
+    print "best of %d interpreter starts:" % REPEAT
+    print "  python -c pass:            %6.2f ms" % (baseline * 1e3)
+    print "  import supports_callbacks: %6.2f ms (+%.2f ms)" % (
+            with_import * 1e3, (with_import - baseline) * 1e3)
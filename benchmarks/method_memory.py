@@ -0,0 +1,78 @@
+"""
+    Compares the memory used by instances of a class with many methods that
+support callbacks, decorated one method at a time with @supports_callbacks
+and with @supports_callbacks_on_methods.  Each variant runs in a forked
+child so the measurements don't disturb each other.  Linux only (reads
+/proc/self/statm).
+
+usage: python benchmarks/method_memory.py [num_instances]
+"""
+import gc
+import os
+import resource
+import sys
+
+from callbacks import supports_callbacks, supports_callbacks_on_methods
+
+NUM_METHODS = 40
+# methods used (called) on every instance
+USED_METHODS = 10
+
+def callback(*args, **kwargs):
+    pass
+
+def make_methods():
+    def make_method(i):
+        def method(self, a):
+            return a
+        method.__name__ = 'method_%d' % i
+        return method
+    return dict(('method_%d' % i, make_method(i)) for i in range(NUM_METHODS))
+
+def per_method_class():
+    methods = dict((name, supports_callbacks(method))
+            for name, method in make_methods().items())
+    return type('PerMethod', (object,), methods)
+
+def class_decorated_class():
+    return supports_callbacks_on_methods(type('ClassDecorated', (object,),
+            make_methods()))
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 1024
+
+def measure(make_class, num_instances, write_fd):
+    cls = make_class()
+    cls.method_0.add_post_callback(callback)
+    gc.collect()
+    before = rss_kb()
+    instances = [cls() for i in range(num_instances)]
+    for instance in instances:
+        for i in range(USED_METHODS):
+            getattr(instance, 'method_%d' % i)(i)
+        instance.method_0.add_pre_callback(callback)
+    gc.collect()
+    os.write(write_fd, str(rss_kb() - before))
+    os._exit(0)
+
+def run(make_class, num_instances):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        measure(make_class, num_instances, write_fd)
+    os.close(write_fd)
+    result = int(os.read(read_fd, 100))
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return result
+
+if __name__ == '__main__':
+    num_instances = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print "%d instances, %d of %d methods used on each (KB):" % (
+            num_instances, USED_METHODS, NUM_METHODS)
+    for name, make_class in [('@supports_callbacks', per_method_class),
+            ('@supports_callbacks_on_methods', class_decorated_class)]:
+        print "  %-32s %10d" % (name, run(make_class, num_instances))
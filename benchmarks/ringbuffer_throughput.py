@@ -0,0 +1,70 @@
+"""
+    Measures the cost a RingBufferSink adds to calls of a decorated function
+and how fast a reader in another process can consume the records.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+import timeit
+
+from callbacks import supports_callbacks
+from callbacks.ringbuffer import RingBufferSink, RingBufferReader
+
+NUM_CALLS = 100000
+CAPACITY = 4096
+
+@supports_callbacks
+def target(a, b=None):
+    return a
+
+def calls():
+    for i in xrange(NUM_CALLS):
+        target(i, b='x')
+
+def consume(path, queue):
+    reader = RingBufferReader(path, from_start=False)
+    queue.put('ready')
+    count = 0
+    idle_since = None
+    while True:
+        records = reader.read()
+        if records:
+            count += len(records)
+            idle_since = None
+        elif idle_since is None:
+            idle_since = time.time()
+        elif time.time() - idle_since > 0.5:
+            break
+    queue.put((count, reader.lost))
+
+if __name__ == '__main__':
+    directory = os.path.isdir('/dev/shm') and '/dev/shm' or None
+    fd, path = tempfile.mkstemp(dir=directory)
+    os.close(fd)
+    try:
+        baseline = min(timeit.repeat(calls, number=1, repeat=3))
+
+        sink = RingBufferSink(path, capacity=CAPACITY)
+        sink.attach(target)
+        with_sink = min(timeit.repeat(calls, number=1, repeat=3))
+
+        queue = multiprocessing.Queue()
+        consumer = multiprocessing.Process(target=consume, args=(path, queue))
+        consumer.start()
+        queue.get()
+        with_reader = timeit.timeit(calls, number=1)
+        count, lost = queue.get()
+        consumer.join()
+        sink.close()
+
+        print "%d calls, ring buffer with %d slots:" % (NUM_CALLS, CAPACITY)
+        print "  without sink:       %6.2f us/call" % (baseline / NUM_CALLS * 1e6)
+        print "  with sink:          %6.2f us/call (%d records/s)" % (
+                with_sink / NUM_CALLS * 1e6, NUM_CALLS / with_sink)
+        print "  with sink + reader: %6.2f us/call" % (
+                with_reader / NUM_CALLS * 1e6)
+        print "  reader received %d records, %d overwritten before read" % (
+                count, lost)
+    finally:
+        os.remove(path)
@@ -0,0 +1,55 @@
+"""
+    Compares restoring a snapshot of callback registrations against replaying
+the add_*_callback calls that produced it.
+"""
+import json
+import timeit
+
+from callbacks import supports_callbacks
+from callbacks.snapshot import snapshot, restore
+
+NUM_TARGETS = 100
+CALLBACKS_PER_TARGET = 50
+REPEAT = 20
+
+def callback(*args, **kwargs):
+    pass
+
+def make_target():
+    @supports_callbacks
+    def target(a, b=None):
+        pass
+    return target
+
+targets = dict(('target_%d' % i, make_target()) for i in range(NUM_TARGETS))
+
+def replay():
+    for target in targets.values():
+        target.remove_callbacks()
+        for i in range(CALLBACKS_PER_TARGET):
+            target.add_pre_callback(callback, label='pre_%d' % i,
+                    priority=i % 3, takes_target_args=True)
+            target.add_post_callback(callback, label='post_%d' % i,
+                    priority=i % 5, takes_target_result=True)
+
+replay()
+data = snapshot(targets)
+serialized = json.dumps(data)
+
+def bulk_restore():
+    restore(data, targets)
+
+def bulk_restore_from_json():
+    restore(json.loads(serialized), targets)
+
+if __name__ == '__main__':
+    print "%d targets, %d registrations each, best of %d:" % (NUM_TARGETS,
+            2 * CALLBACKS_PER_TARGET, REPEAT)
+    replay_time = min(timeit.repeat(replay, number=1, repeat=REPEAT))
+    restore_time = min(timeit.repeat(bulk_restore, number=1, repeat=REPEAT))
+    json_time = min(timeit.repeat(bulk_restore_from_json, number=1,
+            repeat=REPEAT))
+    print "  replaying add_*_callback:    %8.2f ms" % (replay_time * 1e3)
+    print "  restoring snapshot:          %8.2f ms" % (restore_time * 1e3)
+    print "  restoring from json (%d KB): %8.2f ms" % (len(serialized) / 1024,
+            json_time * 1e3)
@@ -1,4 +1,5 @@
-from .callbacks import supports_callbacks
+from .callbacks import (supports_callbacks, supports_callbacks_on_methods,
+        deferred, ShortCircuit, wait_for_background_callbacks, CALLBACKS_SLOT)
 __version__ = '0.1.4'
 
 __doc__ = """
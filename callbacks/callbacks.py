@@ -1,8 +1,92 @@
-from types import MethodType
-from collections import defaultdict
-import uuid
-import inspect
-from weakref import WeakKeyDictionary
+# Only what calling a decorated function needs is imported here, this module
+# is imported by short-lived command line tools where startup time matters.
+# inspect is imported when it is first needed.
+from types import FunctionType, MethodType
+from contextlib import contextmanager
+from functools import partial
+from itertools import count
+from operator import itemgetter
+from os import getpid
+import sys
+import time
+from weakref import WeakKeyDictionary, ref
+try:
+    # this is threading.local, without the cost of importing threading
+    from thread import _local as local, allocate_lock
+except ImportError:
+    from threading import local, Lock as allocate_lock
+
+# Name of the attribute that classes using __slots__ (without __weakref__) or
+# defining __eq__ without __hash__ can add to their __slots__ to hold the
+# per-instance callback registries of their decorated methods.
+CALLBACKS_SLOT = '_callback_proxies'
+
+# clock used to enforce time budgets and time callbacks for demotion, and
+# by default for scheduling (see set_scheduler), module level so tests can
+# replace it
+_clock = time.time
+
+# holds the queue of post callbacks for the active deferred() scope, if any
+_deferred_state = local()
+
+# source of SupportsCallbacks.id
+_ids = count()
+
+# entries of a callback's info that describe_callbacks does not report as flags
+_RECORD_KEYS = frozenset(['function', 'type', 'priority', 'aggregates',
+        'average', 'demoted', 'pending', 'timer', 'last_run', 'deadline'])
+
+# runtime state of a callback's info that is not part of its registration
+_RUNTIME_KEYS = ('aggregates', 'average', 'demoted', 'pending', 'timer',
+        'last_run', 'deadline')
+
+# guards the state that callers share with timer threads: the pending run
+# and timer of throttled/debounced callbacks and the exception groups of
+# aggregating exception callbacks
+_timer_lock = allocate_lock()
+
+# guards the countdown of callbacks registered with <times>, so that
+# concurrent calls never run a callback more often than asked and it expires
+# exactly once
+_expiry_lock = allocate_lock()
+
+# queue feeding the thread that runs callbacks demoted to the background,
+# created (along with the thread) when it is first needed
+_background_queue = None
+# the process that started the worker; a forked child inherits the queue
+# but not the thread, so it starts a worker of its own
+_background_pid = None
+_background_lock = allocate_lock()
+
+class ShortCircuit(object):
+    '''
+        Returned by a pre callback registered with can_short_circuit=True to
+    skip the target (and any pre callbacks that have not run yet).  <value>
+    is returned to the caller and passed to the post callbacks as the
+    target's result.
+    '''
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.value)
+
+class _Docstring(object):
+    '''
+        Generating a SupportsCallbacks docstring needs inspect, so it is only
+    done the first time an instance's __doc__ is looked up.
+    '''
+    def __init__(self, class_docstring):
+        self.class_docstring = class_docstring
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self.class_docstring
+        # sets instance.__dict__['__doc__'], which hides this descriptor
+        instance._update_docstring(instance.target)
+        return instance.__doc__
 
 class SupportsCallbacks(object):
     '''
@@ -11,13 +95,40 @@ class SupportsCallbacks(object):
     target function (or after the target function raises an exception).
     See the docstring for add_*_callback for more information.
     '''
-    def __init__(self, target, target_is_method=False, parent=None):
-        self.id = uuid.uuid4()
+    __doc__ = _Docstring(__doc__)
+
+    def __init__(self, target, target_is_method=False, parent=None,
+            store_on_instance=False):
+        self.id = next(_ids)
         self._target_is_method = target_is_method
+        self._store_on_instance = store_on_instance
         self.target = target
-        self._update_docstring(target)
-        self._instances = WeakKeyDictionary()
+        # see _bind_args
+        self._binder = None
+        if parent is None:
+            self._instances = WeakKeyDictionary()
+            # proxies for instances that are weak-referenceable but
+            # unhashable, keyed by id(instance), see _get_fallback_proxy
+            self._instances_by_id = {}
+        else:
+            # proxies are never looked up through a class, so they don't
+            # need the tables
+            self._instances = None
+            self._instances_by_id = None
         self._parent = parent
+        self._time_budget = None
+        self._shed_below = 0.0
+        self._tracer = None
+        self._recorder = None
+        # call_later(delay, function) used for throttled/debounced callbacks
+        # and the clock its delays are measured on, see set_scheduler
+        self._scheduler = None
+        self._scheduler_clock = None
+        # (threshold, alpha, action) or None, see set_demotion_policy
+        self._demotion = None
+        self._frozen = False
+        # number of times each callback was skipped to stay within budget
+        self.shed_counts = {}
         self._initialize()
 
     def __repr__(self):
@@ -26,25 +137,77 @@ class SupportsCallbacks(object):
     def __get__(self, instance, cls=None):
         """
             To allow each instance of a class to have different callbacks
-        registered we store a callback registry on the instance itself.
-        Keying off of the id of the decorator allows us to have multiple
-        methods support callbacks on the same instance simultaneously.
+        registered we keep a callback registry (a proxy SupportsCallbacks)
+        for each instance.  These are normally held in a WeakKeyDictionary
+        keyed by the instance.  Instances that cannot be weakly referenced
+        or hashed keep them in their CALLBACKS_SLOT attribute instead (see
+        _get_fallback_proxy).  Keying off of the decorator allows us to have
+        multiple methods support callbacks on the same instance
+        simultaneously.
         """
         # in case this method is being called on the class instead of an
         # instance
         if instance is None:
             return self
 
-        if (instance not in self._instances):
-            proxy = SupportsCallbacks(self.target,
-                                         parent=self)
-            proxy = MethodType(proxy, instance, cls)
-            self._instances[instance] = proxy
-        else:
+        if self._store_on_instance:
+            if (hasattr(instance, '__dict__') or
+                    hasattr(type(instance), CALLBACKS_SLOT)):
+                # the registry is only created if it is asked for
+                return _LazyBoundMethod(self, instance, cls)
+
+        try:
             proxy = self._instances[instance]
+        except KeyError:
+            proxy = SupportsCallbacks(self.target, parent=self)
+            self._instances[instance] = proxy
+        except TypeError:
+            # unhashable or not weak-referenceable
+            proxy = self._get_fallback_proxy(instance)
+        # the proxy is bound on every access rather than stored bound, so the
+        # registry never keeps the instance alive
+        return MethodType(proxy, instance, cls)
+
+    def _get_stored_proxy(self, instance):
+        proxies = _get_instance_store(instance)
+        if self not in proxies:
+            proxies[self] = SupportsCallbacks(self.target, parent=self)
+        return proxies[self]
+
+    def _get_fallback_proxy(self, instance):
+        if hasattr(type(instance), CALLBACKS_SLOT):
+            return self._get_stored_proxy(instance)
+
+        key = id(instance)
+        if key in self._instances_by_id:
+            return self._instances_by_id[key][1]
+        try:
+            # drop the entry when the instance is garbage collected, before
+            # its id can be reused
+            instance_ref = ref(instance,
+                    lambda _, key=key: self._instances_by_id.pop(key, None))
+        except TypeError:
+            raise TypeError('Cannot store callbacks for %r instances: they '
+                    'are not weak-referenceable. Add %r to their __slots__.'
+                    % (type(instance).__name__, CALLBACKS_SLOT))
+        proxy = SupportsCallbacks(self.target, parent=self)
+        self._instances_by_id[key] = (instance_ref, proxy)
         return proxy
 
+    def _bind_args(self, args, kwargs):
+        if self._parent is not None:
+            # share the binder of the method rather than building one per
+            # instance
+            return self._parent._bind_args(args, kwargs)
+        # the signature is only inspected the first time a call needs it
+        if self._binder is None:
+            self._binder = _make_binder(self.target,
+                    skip_first=self._target_is_method)
+        return self._binder(args, kwargs)
+
     def _update_docstring(self, target):
+        import inspect
+
         method_or_function = {True:'method',
                               False:'function'}
         old_docstring = target.__doc__
@@ -62,6 +225,7 @@ This %s supports callbacks.
   %s.remove_callback(label)              removes a single callback
   %s.remove_callbacks()                  removes all callbacks
   %s.list_callbacks()                    prints callback information
+  %s.describe_callbacks()                returns: callback records
 ''' % (target.__name__,
                inspect.formatargspec(*inspect.getargspec(target)),
                old_docstring,
@@ -71,21 +235,143 @@ This %s supports callbacks.
                target.__name__,
                target.__name__,
                target.__name__,
+               target.__name__,
                target.__name__)
 
         self.__doc__ = docstring
 
     def _initialize(self):
-        # these hold the order in which callbacks were added
-        self._pre_callbacks = defaultdict(list)
-        self._post_callbacks = defaultdict(list)
-        self._exception_callbacks = defaultdict(list)
+        # these hold the order in which callbacks were added, by priority
+        self._pre_callbacks = {}
+        self._post_callbacks = {}
+        self._exception_callbacks = {}
         # this holds the callback functions and how they should be called
-        self.callbacks = defaultdict(dict)
+        self.callbacks = {}
+        # number of callbacks that need the bound argument mapping
+        self._num_bound_args_callbacks = 0
+        # (priority, label, info) tuples in dispatch order for each callback
+        # type, built when needed and discarded whenever callbacks change
+        self._plans = {}
+        # (type, priority, label) of callbacks that ran out of runs and still
+        # need to be removed from the priority lists
+        self._expired = []
 
         # alias
         self.add_callback = self.add_post_callback
 
+    def _plan(self, type):
+        try:
+            return self._plans[type]
+        except KeyError:
+            self._remove_expired()
+            index = getattr(self, '_%s_callbacks' % type)
+            plan = []
+            for priority in sorted(index.keys(), reverse=True):
+                for label in index[priority]:
+                    # callbacks can expire (in other threads) while the
+                    # plan is being built
+                    info = self.callbacks.get(label)
+                    if info is not None:
+                        plan.append((priority, label, info))
+            plan = tuple(plan)
+            self._plans[type] = plan
+            return plan
+
+    def _count_down(self, label, info):
+        '''
+            Takes one of the remaining runs of a callback registered with
+        <times>, expiring it when it was the last one.
+        Returns:
+            False if the callback has no runs left (it expired, possibly in
+            another thread) and must not be run, True otherwise.
+        '''
+        with _expiry_lock:
+            remaining = info['remaining']
+            if remaining <= 0:
+                return False
+            info['remaining'] = remaining - 1
+            if remaining == 1:
+                self._remove_entry(label, info)
+        return True
+
+    def _expire(self, label, info):
+        with _expiry_lock:
+            if info['remaining'] == 0:
+                # already expired
+                return
+            info['remaining'] = 0
+            self._remove_entry(label, info)
+
+    def _remove_entry(self, label, info):
+        # Called with _expiry_lock held, once per entry.  This is called
+        # while the plans are being iterated over, so rather than touching
+        # them (or the priority lists) the entry is marked as removed (its
+        # remaining runs are 0), which makes the dispatch loops skip it, and
+        # the priority lists are cleaned up before they are next used.
+        if self.callbacks.get(label) is info:
+            self.callbacks.pop(label, None)
+        if info.get('timer') is not None:
+            info['timer'].cancel()
+            info['timer'] = None
+        if info['takes_bound_args']:
+            self._num_bound_args_callbacks -= 1
+        self._expired.append((info['type'], info['priority'], label))
+
+    def _remove_expired(self):
+        with _expiry_lock:
+            expired, self._expired = self._expired, []
+        for type, priority, label in expired:
+            labels = getattr(self, '_%s_callbacks' % type).get(priority)
+            if labels is not None and label in labels:
+                labels.remove(label)
+
+    def freeze(self):
+        '''
+            Compiles the dispatch order of the registered callbacks and locks
+        the registration: adding or removing callbacks, or changing the
+        demotion policy, raises a RuntimeError until thaw() is called.  Calls
+        to a frozen target only read its callbacks, so callbacks that keep
+        state updated by calls (those registered with times, throttle,
+        debounce or aggregate_window) and demotion policies (see
+        set_demotion_policy) are rejected.  Note that each instance of a
+        decorated method has its own registration, which is not frozen
+        along with the method.
+        Returns:
+            None
+        '''
+        for label, info in self.callbacks.items():
+            if (info['remaining'] is not None or
+                    info.get('throttle') is not None or
+                    info.get('debounce') is not None or
+                    info.get('aggregate_window') is not None):
+                raise RuntimeError('Callback with label="%s" of "%s" keeps '
+                        'state that calls update (times, throttle, debounce '
+                        'or aggregate_window) and cannot be frozen.' %
+                        (label, self.target.__name__))
+        if self._demotion is not None:
+            raise RuntimeError('Callbacks of "%s" have a demotion policy and '
+                    'cannot be frozen.' % self.target.__name__)
+        for type in ('pre', 'post', 'exception'):
+            self._plan(type)
+        self._frozen = True
+
+    def thaw(self):
+        '''
+            Allows callbacks to be added and removed again after freeze().
+        Returns:
+            None
+        '''
+        self._frozen = False
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise RuntimeError('Callbacks of "%s" are frozen, call thaw() '
+                    'before changing them.' % self.target.__name__)
+
     @property
     def _callbacks_info(self):
         format_string = '%38s  %9s  %6s  %10s  %11s  %14s'
@@ -93,24 +379,240 @@ This %s supports callbacks.
         lines.append(format_string %
                 ('Label', 'priority', 'order', 'type', 'takes args', 'takes result'))
 
-        for label, info in sorted(self.callbacks.items()):
-            order = getattr(self, '_%s_callbacks' % info['type'])[info['priority']].index(label)
-            lines.append(format_string % (label, info['priority'], order,
-                    info['type'], info['takes_target_args'], info.get('takes_target_result', 'N/A')))
+        records = self.describe_callbacks(include_parent=False)
+        for record in sorted(records, key=itemgetter('label')):
+            flags = record['flags']
+            lines.append(format_string % (record['label'], record['priority'],
+                    record['order'], record['type'],
+                    flags['takes_target_args'],
+                    flags.get('takes_target_result', 'N/A')))
 
         return '\n'.join(lines)
 
+    def describe_callbacks(self, include_parent=True):
+        '''
+            Describes the registered callbacks without formatting them, in
+        time proportional to the number of callbacks.
+        Inputs:
+            include_parent: If True and this is the registration of an
+                instance of a decorated method, the callbacks registered on
+                the method itself are described as well.
+        Returns:
+            A list of dictionaries, in dispatch order for each type, with the
+            keys 'label', 'function', 'type', 'priority', 'order' (position
+            among the callbacks of the same type and priority), 'origin'
+            ('self', or 'parent' for callbacks registered on the method) and
+            'flags' (a dictionary of the options the callback was registered
+            with).
+        '''
+        records = []
+        sources = [('self', self)]
+        if include_parent and self._parent is not None:
+            sources.append(('parent', self._parent))
+        for origin, source in sources:
+            for type in ('pre', 'post', 'exception'):
+                last_priority = None
+                for priority, label, info in source._plan(type):
+                    if info['remaining'] == 0:
+                        continue
+                    if priority != last_priority:
+                        last_priority = priority
+                        order = 0
+                    flags = dict((key, value) for key, value in info.items()
+                            if key not in _RECORD_KEYS)
+                    records.append({'label': label,
+                            'function': info['function'],
+                            'type': type,
+                            'priority': priority,
+                            'order': order,
+                            'origin': origin,
+                            'flags': flags})
+                    order += 1
+        return records
+
     def list_callbacks(self):
         '''
             List all of the callbacks registered to this function or method.
         '''
         print self._callbacks_info
 
+    def set_time_budget(self, budget, shed_below=0.0):
+        '''
+            Sets a latency budget for calls to the target.  Once <budget>
+        seconds have elapsed since the call started, pre and post callbacks
+        with a priority below <shed_below> are skipped for the rest of the
+        call.  Callbacks with a priority of at least <shed_below> always run.
+        Skipped callbacks are counted in <shed_counts>, keyed by label.
+        Inputs:
+            budget: Number of seconds, or None to remove the budget.
+            shed_below: Number. Priority threshold for best-effort callbacks.
+        Returns:
+            None
+        '''
+        if budget is not None:
+            try:
+                budget = float(budget)
+            except:
+                raise ValueError('Budget could not be cast into a float.')
+        try:
+            shed_below = float(shed_below)
+        except:
+            raise ValueError('shed_below could not be cast into a float.')
+        self._time_budget = budget
+        self._shed_below = shed_below
+
+    def set_tracer(self, tracer):
+        '''
+            Records the execution of the target and of each callback run on
+        <tracer> (see callbacks.tracing.Tracer).  The tracer is also used for
+        calls made through instances of a decorated method, unless they have
+        a tracer of their own.
+        Inputs:
+            tracer: An object with begin(name, type, priority=None) and
+                end(name, type, priority=None) methods, or None to stop
+                tracing.
+        Returns:
+            None
+        '''
+        self._tracer = tracer
+
+    def _get_tracer(self):
+        # see set_tracer
+        if self._tracer is None and self._parent is not None:
+            return self._parent._tracer
+        return self._tracer
+
+    def set_recorder(self, recorder):
+        '''
+            Reports every call of the target to <recorder> (see
+        callbacks.recording.CallRecorder).  The recorder is also used for
+        calls made through instances of a decorated method, unless they have
+        a recorder of their own.
+        Inputs:
+            recorder: An object with a record(args, kwargs, outcome, value,
+                started, duration) method, or None to stop recording.
+                <outcome> is 'result' or 'exception', <value> is the
+                returned value or the exception raised.  <args> do not
+                include the instance a method was called on.
+        Returns:
+            None
+        '''
+        self._recorder = recorder
+
+    def set_scheduler(self, call_later, clock=None):
+        '''
+            Sets how the trailing runs of throttled and debounced callbacks
+        (see add_post_callback) and the closing of exception aggregation
+        windows (see add_exception_callback) are scheduled, and the clock
+        that throttle, debounce and aggregation intervals are measured on.
+        Both are also used by instances of a decorated method, unless they
+        have their own.
+        Inputs:
+            call_later: A function taking a delay in seconds and a function
+                to call after that delay, returning an object with a
+                cancel() method (like an event loop's call_later), or None
+                to use a threading.Timer per scheduled run.
+            clock: A function returning the current time in seconds (like
+                an event loop's time), or None to use time.time.
+        Returns:
+            None
+        '''
+        self._scheduler = call_later
+        self._scheduler_clock = clock
+
+    def _now(self):
+        # the time on the clock of the scheduler, see set_scheduler
+        clock = self._scheduler_clock
+        if clock is None and self._parent is not None:
+            clock = self._parent._scheduler_clock
+        if clock is None:
+            return _clock()
+        return clock()
+
+    def set_demotion_policy(self, threshold, alpha=0.2, action='background'):
+        '''
+            Keeps an exponentially weighted moving average of the runtime of
+        each pre and post callback.  Once a callback's average exceeds
+        <threshold> it is demoted: with action='background' it is run on a
+        background thread from then on (so the target no longer waits for
+        it), with action='flag' it keeps running as before.  Demotions are
+        logged on the 'callbacks' logger and listed by demoted_callbacks().
+        Callbacks registered with order_critical or can_short_circuit are
+        never demoted, neither are exception callbacks.
+        Inputs:
+            threshold: Number of seconds, or None to remove the policy (which
+                also reinstates all demoted callbacks).
+            alpha: Number between 0 and 1, the weight of the latest run in
+                the moving average.
+            action: 'background' or 'flag'.
+        Returns:
+            None
+        '''
+        self._check_not_frozen()
+        for info in self.callbacks.values():
+            if 'average' in info:
+                info['average'] = None
+                info['demoted'] = None
+        if threshold is None:
+            self._demotion = None
+            return
+        try:
+            threshold = float(threshold)
+        except:
+            raise ValueError('Threshold could not be cast into a float.')
+        try:
+            alpha = float(alpha)
+        except:
+            raise ValueError('Alpha could not be cast into a float.')
+        if not 0 < alpha <= 1:
+            raise ValueError('Alpha must be greater than 0 and at most 1.')
+        if action not in ('background', 'flag'):
+            raise ValueError('Action must be "background" or "flag".')
+        self._demotion = (threshold, alpha, action)
+
+    def demoted_callbacks(self):
+        '''
+            Returns a dictionary mapping the label of each demoted callback
+        (see set_demotion_policy) to a (action, average runtime) tuple.
+        '''
+        return dict((label, (info['demoted'], info['average']))
+                for label, info in self.callbacks.items()
+                if info.get('demoted') is not None)
+
+    def _update_runtime(self, label, info, runtime):
+        threshold, alpha, action = self._demotion
+        average = info['average']
+        if average is None:
+            average = runtime
+        else:
+            average = alpha * runtime + (1 - alpha) * average
+        info['average'] = average
+        if (average > threshold and info['demoted'] is None and
+                not info['order_critical'] and
+                not info.get('can_short_circuit')):
+            info['demoted'] = action
+            import logging
+            logging.getLogger('callbacks').warning(
+                    'Demoted %s callback %r of "%s" (%s): average runtime '
+                    '%.6fs exceeds %.6fs', info['type'], label,
+                    self.target.__name__, action, average, threshold)
+
+    def _deadline(self, started):
+        if started is None or self._time_budget is None:
+            return None
+        return started + self._time_budget
+
     def add_post_callback(self, callback,
             priority=0,
             label=None,
             takes_target_args=False,
-            takes_target_result=False):
+            takes_target_result=False,
+            takes_bound_args=False,
+            defer_key=None,
+            times=None,
+            order_critical=False,
+            throttle=None,
+            debounce=None):
         '''
             Registers the callback to be called after the target is called.
         Inputs:
@@ -129,21 +631,53 @@ This %s supports callbacks.
             takes_target_result: If True, callback will be passed, as
                 its first argument, the value returned from calling the
                 target function.
+            takes_bound_args: If True, callback function will be passed a
+                single dictionary mapping the target's parameter names to
+                the values they were called with (defaults applied).
+                Cannot be combined with takes_target_args.
+            defer_key: A function, or None.  Inside a deferred() context,
+                queued runs of this callback are deduplicated by the value
+                returned from calling defer_key with the arguments and
+                keyword arguments supplied to the target function.  If None,
+                the callback runs at most once per deferred() context.
+            times: The number of times the callback will be run before it
+                is removed automatically, or None to keep it until it is
+                removed with remove_callback.
+            order_critical: If True, the callback is never demoted to a
+                background thread (see set_demotion_policy).
+            throttle: Number of seconds, or None.  If set, the callback
+                runs at most once per <throttle> seconds: the first call
+                runs it right away, calls during the following <throttle>
+                seconds schedule a single run (see set_scheduler) with the
+                arguments of the latest of them.
+            debounce: Number of seconds, or None.  If set, the callback runs
+                once <debounce> seconds after a burst of calls has ended,
+                with the arguments of the latest call.
+                Throttled and debounced callbacks are passed the result of
+                the call whose arguments they get, and are not queued by
+                deferred().
         Returns:
             label
         '''
+        throttle, debounce = _check_rate_limit(throttle, debounce)
         priority, label = self._add_callback(callback=callback,
                 priority=priority, label=label,
-                takes_target_args=takes_target_args, type='post')
-        self._post_callbacks[priority].append(label)
+                takes_target_args=takes_target_args,
+                takes_bound_args=takes_bound_args, times=times, type='post')
+        self._post_callbacks.setdefault(priority, []).append(label)
         self.callbacks[label]['takes_target_result'] = takes_target_result
+        self.callbacks[label]['defer_key'] = defer_key
+        self._add_runtime_state(label, order_critical, throttle, debounce)
         return label
 
     def add_exception_callback(self, callback,
             priority=0,
             label=None,
             takes_target_args=False,
-            handles_exception=False):
+            handles_exception=False,
+            takes_bound_args=False,
+            times=None,
+            aggregate_window=None):
         '''
             Registers the callback to be called after the target raises an
         exception.  Exception callbacks are called in priority order and can
@@ -168,20 +702,62 @@ This %s supports callbacks.
                 handling the exception or reraising it!  NOTE: If True and
                 the exception has already been handled, this callback will
                 not be called.
+            takes_bound_args: If True, callback function will be passed a
+                single dictionary mapping the target's parameter names to
+                the values they were called with (defaults applied).
+                Cannot be combined with takes_target_args.
+            times: The number of times the callback will be run before it
+                is removed automatically, or None to keep it until it is
+                removed with remove_callback.
+            aggregate_window: Number of seconds, or None.  If set, identical
+                exceptions (same type, message and location the exception
+                was raised from) are grouped: the callback is called for
+                the first exception of a group, then when the window closes
+                if more exceptions of the group arrived during it (at most
+                once per <aggregate_window> seconds), and is passed (as its
+                first two arguments) the latest exception and the number of
+                exceptions it stands for.  Windows are closed by a timer
+                (see set_scheduler), so by default those calls are made on
+                a timer thread.  See flush_aggregated_exceptions.
+                Cannot be combined with handles_exception.
         Returns:
             label
         '''
+        if aggregate_window is not None:
+            if handles_exception:
+                raise ValueError('Callbacks that handle exceptions cannot '
+                        'aggregate them.')
+            try:
+                aggregate_window = float(aggregate_window)
+            except:
+                raise ValueError('Aggregate window could not be cast into '
+                        'a float.')
         priority, label = self._add_callback(callback=callback,
                 priority=priority, label=label,
-                takes_target_args=takes_target_args, type='exception')
-        self._exception_callbacks[priority].append(label)
+                takes_target_args=takes_target_args,
+                takes_bound_args=takes_bound_args, times=times,
+                type='exception')
+        self._exception_callbacks.setdefault(priority, []).append(label)
         self.callbacks[label]['handles_exception'] = handles_exception
+        self.callbacks[label]['aggregate_window'] = aggregate_window
+        if aggregate_window is not None:
+            # exception key -> [window start, number of exceptions not yet
+            # reported, latest exception, args, kwargs, bound_args]
+            self.callbacks[label]['aggregates'] = {}
+            # closes the earliest window with unreported exceptions
+            self.callbacks[label]['timer'] = None
         return label
 
     def add_pre_callback(self, callback,
             priority=0,
             label=None,
-            takes_target_args=False):
+            takes_target_args=False,
+            takes_bound_args=False,
+            times=None,
+            can_short_circuit=False,
+            order_critical=False,
+            throttle=None,
+            debounce=None):
         '''
         Registers the callback to be called before the target.
         Inputs:
@@ -197,36 +773,227 @@ This %s supports callbacks.
             takes_target_args: If True, callback function will be passed the
                 arguments and keyword arguments that are supplied to the
                 target function.
+            takes_bound_args: If True, callback function will be passed a
+                single dictionary mapping the target's parameter names to
+                the values they were called with (defaults applied).
+                Cannot be combined with takes_target_args.
+            times: The number of times the callback will be run before it
+                is removed automatically, or None to keep it until it is
+                removed with remove_callback.
+            can_short_circuit: If True and the callback returns a
+                ShortCircuit, the target and the remaining pre callbacks are
+                skipped and the ShortCircuit's value is used as the target's
+                result.  Any other return value is ignored.
+            order_critical: If True, the callback is never demoted to a
+                background thread (see set_demotion_policy).
+            throttle: Number of seconds, or None.  If set, the callback
+                runs at most once per <throttle> seconds: the first call
+                runs it right away, calls during the following <throttle>
+                seconds schedule a single run (see set_scheduler) with the
+                arguments of the latest of them.
+            debounce: Number of seconds, or None.  If set, the callback runs
+                once <debounce> seconds after a burst of calls has ended,
+                with the arguments of the latest call.
+                Cannot be combined with can_short_circuit.
         Returns:
             label
         '''
+        throttle, debounce = _check_rate_limit(throttle, debounce)
+        if can_short_circuit and (throttle is not None or
+                debounce is not None):
+            raise ValueError('Throttled or debounced callbacks cannot '
+                    'short-circuit the target.')
 
         priority, label = self._add_callback(callback=callback,
                 priority=priority, label=label,
-                takes_target_args=takes_target_args, type='pre')
-        self._pre_callbacks[priority].append(label)
+                takes_target_args=takes_target_args,
+                takes_bound_args=takes_bound_args, times=times, type='pre')
+        self._pre_callbacks.setdefault(priority, []).append(label)
+        self.callbacks[label]['can_short_circuit'] = can_short_circuit
+        self._add_runtime_state(label, order_critical, throttle, debounce)
         return label
 
-    def _add_callback(self, callback, priority, label, takes_target_args, type):
+    def _add_runtime_state(self, label, order_critical, throttle, debounce):
+        info = self.callbacks[label]
+        info['order_critical'] = order_critical
+        # moving average of the runtime in seconds and the action taken when
+        # it got too slow, see set_demotion_policy
+        info['average'] = None
+        info['demoted'] = None
+        info['throttle'] = throttle
+        info['debounce'] = debounce
+        # (runner, arguments) of the run waiting for the timer, the timer,
+        # when the callback last ran and when a debounced callback is due,
+        # see _rate_limit
+        info['pending'] = None
+        info['timer'] = None
+        info['last_run'] = None
+        info['deadline'] = None
+
+    def _rate_limit(self, label, info, runner, arguments):
+        '''
+            Handles a call for a throttled or debounced callback: runs it
+        right away (leading edge of a throttle) or records it as the pending
+        run and makes sure a timer is scheduled to deliver it.
+        '''
+        now = self._now()
+        throttle = info['throttle']
+        with _timer_lock:
+            if (throttle is not None and info['timer'] is None and
+                    (info['last_run'] is None or
+                    now - info['last_run'] >= throttle)):
+                info['last_run'] = now
+                run_now = True
+            else:
+                run_now = False
+                info['pending'] = (runner, arguments)
+                if throttle is not None:
+                    delay = info['last_run'] + throttle - now
+                else:
+                    delay = info['debounce']
+                    info['deadline'] = now + delay
+                if info['timer'] is None:
+                    info['timer'] = self._schedule(delay,
+                            partial(self._on_timer, label, info))
+        if run_now:
+            self._deliver(label, info, runner, arguments)
+
+    def _schedule(self, delay, function):
+        call_later = self._scheduler
+        if call_later is None and self._parent is not None:
+            call_later = self._parent._scheduler
+        if call_later is None:
+            call_later = _call_later
+        return call_later(delay, function)
+
+    def _on_timer(self, label, info):
+        with _timer_lock:
+            info['timer'] = None
+            now = self._now()
+            if info['debounce'] is not None and info['deadline'] > now:
+                # called again since the timer was scheduled
+                info['timer'] = self._schedule(info['deadline'] - now,
+                        partial(self._on_timer, label, info))
+                return
+            pending = info['pending']
+            info['pending'] = None
+            info['last_run'] = now
+        # the callback may have been removed while the run was pending
+        if pending is None or self.callbacks.get(label) is not info:
+            return
+        try:
+            self._deliver(label, info, *pending)
+        except Exception:
+            import logging
+            logging.getLogger('callbacks').exception(
+                    'Callback %r of "%s" failed', label,
+                    self.target.__name__)
+
+    def _deliver(self, label, info, runner, arguments):
+        if info['remaining'] is not None and not self._count_down(label, info):
+            return
+        tracer = self._get_tracer()
+        if tracer is None:
+            runner(info, *arguments)
+        else:
+            tracer.begin(label, info['type'], info['priority'])
+            try:
+                runner(info, *arguments)
+            finally:
+                tracer.end(label, info['type'], info['priority'])
+
+    def _add_callback(self, callback, priority, label, takes_target_args,
+            takes_bound_args, times, type):
+        self._check_not_frozen()
         try:
             priority = float(priority)
         except:
             raise ValueError('Priority could not be cast into a float.')
 
+        if times is not None and (not isinstance(times, (int, long)) or
+                times < 1):
+            raise ValueError('Times must be None or a positive integer.')
+
+        if takes_target_args and takes_bound_args:
+            raise ValueError('Only one of takes_target_args and '
+                    'takes_bound_args can be True.')
+
         if label is None:
             label = callback
 
         if label in self.callbacks.keys():
             raise RuntimeError('Callback with label="%s" already registered.'
                     % label)
+        self._remove_expired()
 
+        self.callbacks[label] = {}
         self.callbacks[label]['function'] = callback
         self.callbacks[label]['priority'] = priority
         self.callbacks[label]['takes_target_args'] = takes_target_args
+        self.callbacks[label]['takes_bound_args'] = takes_bound_args
         self.callbacks[label]['type'] = type
+        # runs left before the callback is removed, None means unlimited,
+        # 0 means it has been removed (see _expire)
+        self.callbacks[label]['remaining'] = times
+        if takes_bound_args:
+            self._num_bound_args_callbacks += 1
+        self._plans = {}
 
         return priority, label
 
+    def _registrations(self):
+        '''
+            Returns a list of (type, priority, label, info) for every
+        registered callback, in dispatch order.  <info> is a copy of the
+        callback's entry in self.callbacks, without any runtime state.
+        '''
+        registrations = []
+        for type in ('pre', 'post', 'exception'):
+            for priority, label, info in self._plan(type):
+                if info['remaining'] != 0:
+                    info = dict(info)
+                    for key in _RUNTIME_KEYS:
+                        info.pop(key, None)
+                    registrations.append((type, priority, label, info))
+        return registrations
+
+    def _restore_registrations(self, registrations):
+        '''
+            Replaces all callbacks with <registrations> (as returned by
+        _registrations) in a single step.  Unlike add_*_callback, nothing is
+        validated except that labels are unique.
+        '''
+        self._check_not_frozen()
+        index = {'pre': {}, 'post': {}, 'exception': {}}
+        callbacks = {}
+        for type, priority, label, info in registrations:
+            if label in callbacks:
+                raise RuntimeError('Callback with label="%s" already '
+                        'registered.' % label)
+            info.setdefault('remaining', None)
+            if type == 'pre':
+                info.setdefault('can_short_circuit', False)
+            if type != 'exception':
+                info.setdefault('order_critical', False)
+                info.setdefault('throttle', None)
+                info.setdefault('debounce', None)
+                info.update(average=None, demoted=None, pending=None,
+                        timer=None, last_run=None, deadline=None)
+            if info.get('aggregate_window') is not None:
+                info['aggregates'] = {}
+                info['timer'] = None
+            callbacks[label] = info
+            index[type].setdefault(priority, []).append(label)
+
+        self._pre_callbacks = index['pre']
+        self._post_callbacks = index['post']
+        self._exception_callbacks = index['exception']
+        self.callbacks = callbacks
+        self._expired = []
+        self._num_bound_args_callbacks = sum(1 for info in callbacks.values()
+                if info['takes_bound_args'])
+        self._plans = {}
+
     def remove_callback(self, label):
         '''
         Unregisters the callback from the target.
@@ -238,18 +1005,17 @@ This %s supports callbacks.
         Returns:
             None
         '''
-        if label not in self.callbacks.keys():
+        self._check_not_frozen()
+        info = self.callbacks.get(label)
+        if info is None:
             raise RuntimeError(
                     'No callback with label "%s" attached to function "%s"' %
                     (label, self.target.__name__))
 
-        for index in [self._pre_callbacks, self._post_callbacks,
-                self._exception_callbacks]:
-            for priority in index.keys():
-                if label in index[priority]:
-                    index[priority].remove(label)
-
-        del self.callbacks[label]
+        # a call that is already dispatching must not run it either
+        self._expire(label, info)
+        self._remove_expired()
+        self._plans = {}
 
     def remove_callbacks(self, labels=None):
         '''
@@ -260,6 +1026,7 @@ This %s supports callbacks.
         Returns:
             None
         '''
+        self._check_not_frozen()
         if labels is not None:
             bad_labels = []
             for label in labels:
@@ -281,81 +1048,703 @@ This %s supports callbacks.
         else:
             cb_args = args
 
+        # the bound argument mapping is built at most once per call and
+        # shared by every callback (of self and parent) that asks for it
+        if self._num_bound_args_callbacks or (self._parent and
+                self._parent._num_bound_args_callbacks):
+            bound_args = self._bind_args(cb_args, kwargs)
+        else:
+            bound_args = None
+
+        if self._time_budget is not None or (self._parent and
+                self._parent._time_budget is not None):
+            started = _clock()
+        else:
+            started = None
+
+        # the same tracer records the target and the callbacks of self and
+        # parent
+        tracer = self._get_tracer()
+
         # FIXME: merge priorities between self and parent
-        self._call_pre_callbacks(*cb_args, **kwargs)
-        if self._parent:
-            self._parent._call_pre_callbacks(*cb_args, **kwargs)
-        try:
-            target_result = self.target(*args, **kwargs)
-        except Exception as e:
-            target_result = self._call_exception_callbacks(e, *cb_args, **kwargs)
-            if self._parent:
-                self._parent._call_pre_callbacks(*cb_args, **kwargs)
+        short_circuit = self._call_pre_callbacks(cb_args, kwargs, bound_args,
+                started, tracer)
+        if short_circuit is None and self._parent:
+            short_circuit = self._parent._call_pre_callbacks(cb_args, kwargs,
+                    bound_args, started, tracer)
+        if short_circuit is not None:
+            target_result = short_circuit.value
+        else:
+            recorder = self._recorder
+            if recorder is None and self._parent:
+                recorder = self._parent._recorder
+            try:
+                if tracer is None and recorder is None:
+                    target_result = self.target(*args, **kwargs)
+                else:
+                    target_result = self._call_target(args, cb_args, kwargs,
+                            tracer, recorder)
+            except Exception as e:
+                target_result = self._call_exception_callbacks(e, cb_args,
+                        kwargs, bound_args, tracer)
+                if self._parent:
+                    self._parent._call_pre_callbacks(cb_args, kwargs,
+                            bound_args, started, tracer)
         # FIXME: the post callback should not be called if the main function
         # errors.
-        self._call_post_callbacks(target_result, *cb_args, **kwargs)
+        self._call_post_callbacks(target_result, cb_args, kwargs, bound_args,
+                started, tracer)
         if self._parent:
-            self._parent._call_post_callbacks(target_result, *cb_args, **kwargs)
+            self._parent._call_post_callbacks(target_result, cb_args, kwargs,
+                    bound_args, started, tracer)
         return target_result
 
-    def _call_pre_callbacks(self, *args, **kwargs):
-        for priority in sorted(self._pre_callbacks.keys(), reverse=True):
-            for label in self._pre_callbacks[priority]:
-                callback = self.callbacks[label]['function']
-                takes_target_args = self.callbacks[label]['takes_target_args']
-                if takes_target_args:
-                    callback(*args, **kwargs)
-                else:
-                    callback()
+    def _call_target(self, args, cb_args, kwargs, tracer, recorder):
+        if tracer is not None:
+            tracer.begin(self.target.__name__, 'target')
+        try:
+            if recorder is None:
+                return self.target(*args, **kwargs)
+
+            if self._parent is not None or self._store_on_instance:
+                # don't record the instance the method was called on
+                cb_args = cb_args[1:]
+            started = time.time()
+            try:
+                target_result = self.target(*args, **kwargs)
+            except Exception as e:
+                self._record(recorder, cb_args, kwargs, 'exception', e,
+                        started)
+                raise
+            self._record(recorder, cb_args, kwargs, 'result', target_result,
+                    started)
+            return target_result
+        finally:
+            if tracer is not None:
+                tracer.end(self.target.__name__, 'target')
 
-    def _call_exception_callbacks(self, exception, *args, **kwargs):
+    def _record(self, recorder, args, kwargs, outcome, value, started):
+        # the call has already happened, a failing recorder must not change
+        # its outcome (or be mistaken for the target raising)
+        try:
+            recorder.record(args, kwargs, outcome, value, started,
+                    time.time() - started)
+        except Exception:
+            import logging
+            logging.getLogger('callbacks').exception(
+                    'Recorder %r of "%s" failed', recorder,
+                    self.target.__name__)
+
+    def _call_pre_callbacks(self, args, kwargs, bound_args=None,
+            started=None, tracer=None):
+        '''
+            Runs the pre callbacks.
+        Returns:
+            The ShortCircuit returned by a callback registered with
+            can_short_circuit, or None if the target should be called.
+        '''
+        deadline = self._deadline(started)
+        timed = self._demotion is not None
+        for priority, label, info in self._plan('pre'):
+            remaining = info['remaining']
+            if remaining == 0:
+                # expired, see _expire
+                continue
+            if (deadline is not None and priority < self._shed_below and
+                    _clock() > deadline):
+                self.shed_counts[label] = self.shed_counts.get(label, 0) + 1
+                continue
+            if info['throttle'] is not None or info['debounce'] is not None:
+                self._rate_limit(label, info, self._run_pre_callback,
+                        (args, kwargs, bound_args))
+                continue
+            if remaining is not None and not self._count_down(label, info):
+                continue
+            if info['demoted'] == 'background':
+                _run_in_background(self._run_pre_callback, info, args, kwargs,
+                        bound_args)
+                continue
+            if timed:
+                callback_started = _clock()
+            if tracer is None:
+                result = self._run_pre_callback(info, args, kwargs,
+                        bound_args)
+            else:
+                tracer.begin(label, 'pre', priority)
+                try:
+                    result = self._run_pre_callback(info, args, kwargs,
+                            bound_args)
+                finally:
+                    tracer.end(label, 'pre', priority)
+            if timed:
+                self._update_runtime(label, info, _clock() - callback_started)
+            if info['can_short_circuit'] and isinstance(result, ShortCircuit):
+                return result
+        return None
+
+    def _run_pre_callback(self, info, args, kwargs, bound_args):
+        callback = info['function']
+        if info['takes_bound_args']:
+            return callback(bound_args)
+        elif info['takes_target_args']:
+            return callback(*args, **kwargs)
+        else:
+            return callback()
+
+    def _call_exception_callbacks(self, exception, args, kwargs,
+            bound_args=None, tracer=None):
         result = None
-        for priority in sorted(self._exception_callbacks.keys(), reverse=True):
-            for label in self._exception_callbacks[priority]:
-                callback = self.callbacks[label]['function']
-                takes_target_args = self.callbacks[label]['takes_target_args']
-                handles_exception = self.callbacks[label]['handles_exception']
-
-                if handles_exception and exception is None:
-                    # exception has already been handled, only call callbacks
-                    # that don't handle exceptions
-                    continue
+        target_exception = exception
+        for priority, label, info in self._plan('exception'):
+            handles_exception = info['handles_exception']
 
-                if takes_target_args and handles_exception:
-                    try:
-                        result = callback(exception, *args, **kwargs)
-                        exception = None
-                    except Exception as exception:
-                        continue
-                elif handles_exception:
+            if handles_exception and exception is None:
+                # exception has already been handled, only call callbacks
+                # that don't handle exceptions
+                continue
+
+            if info['aggregate_window'] is not None:
+                if info['remaining'] != 0:
+                    if exception is None:
+                        exception_to_report = target_exception
+                    else:
+                        exception_to_report = exception
+                    self._aggregate_exception(priority, label, info,
+                            exception_to_report, args, kwargs, bound_args,
+                            tracer)
+                continue
+
+            if (info['remaining'] is not None and
+                    not self._count_down(label, info)):
+                continue
+
+            if tracer is not None:
+                tracer.begin(label, 'exception', priority)
+            try:
+                if handles_exception:
                     try:
-                        result = callback(exception)
+                        result = self._run_exception_callback(info,
+                                exception, args, kwargs, bound_args)
                         exception = None
                     except Exception as exception:
                         continue
-                elif takes_target_args:
-                    callback(*args, **kwargs)
                 else:
-                    callback()
+                    self._run_exception_callback(info, None, args, kwargs,
+                            bound_args)
+            finally:
+                if tracer is not None:
+                    tracer.end(label, 'exception', priority)
         if exception is not None:
             raise exception
         else:
             return result
 
-    def _call_post_callbacks(self, target_result, *args, **kwargs):
-        for priority in sorted(self._post_callbacks.keys(), reverse=True):
-            for label in self._post_callbacks[priority]:
-                callback = self.callbacks[label]['function']
-                takes_target_args = self.callbacks[label]['takes_target_args']
-                takes_target_result = self.callbacks[label]['takes_target_result']
-                if takes_target_args and takes_target_result:
-                    callback(target_result, *args, **kwargs)
-                elif takes_target_result:
-                    callback(target_result)
-                elif takes_target_args:
-                    callback(*args, **kwargs)
+    def _aggregate_exception(self, priority, label, info, exception, args,
+            kwargs, bound_args, tracer):
+        key = _exception_key(exception)
+        now = self._now()
+        window = info['aggregate_window']
+        aggregates = info['aggregates']
+        with _timer_lock:
+            group = aggregates.get(key)
+            if group is not None and now - group[0] < window:
+                group[1] += 1
+                group[2:] = [exception, args, kwargs, bound_args]
+                if info['timer'] is None:
+                    info['timer'] = self._schedule(group[0] + window - now,
+                            partial(self._close_windows, priority, label,
+                            info))
+                return
+
+            if group is None:
+                count = 1
+                self._prune_aggregates(info, now)
+            else:
+                count = group[1] + 1
+            aggregates[key] = [now, 0, None, None, None, None]
+        self._report_aggregate(priority, label, info, exception, count, args,
+                kwargs, bound_args, tracer)
+
+    def _close_windows(self, priority, label, info):
+        '''
+            Reports the exceptions of the groups whose window has closed and
+        schedules itself again for the next window to close, if any.
+        '''
+        with _timer_lock:
+            info['timer'] = None
+            # the callback may have been removed since the timer was set
+            if self.callbacks.get(label) is not info:
+                return
+            now = self._now()
+            window = info['aggregate_window']
+            due = []
+            next_close = None
+            for group in info['aggregates'].values():
+                if not group[1]:
+                    continue
+                closes = group[0] + window
+                if closes <= now:
+                    due.append(group[1:])
+                    group[:] = [now, 0, None, None, None, None]
+                elif next_close is None or closes < next_close:
+                    next_close = closes
+            if next_close is not None:
+                info['timer'] = self._schedule(next_close - now,
+                        partial(self._close_windows, priority, label, info))
+
+        tracer = self._get_tracer()
+        for count, exception, args, kwargs, bound_args in due:
+            if info['remaining'] == 0:
+                break
+            try:
+                self._report_aggregate(priority, label, info, exception,
+                        count, args, kwargs, bound_args, tracer)
+            except Exception:
+                import logging
+                logging.getLogger('callbacks').exception(
+                        'Callback %r of "%s" failed', label,
+                        self.target.__name__)
+
+    def _prune_aggregates(self, info, now):
+        window = info['aggregate_window']
+        aggregates = info['aggregates']
+        for key, group in aggregates.items():
+            if group[1] == 0 and now - group[0] >= window:
+                del aggregates[key]
+
+    def _report_aggregate(self, priority, label, info, exception, count, args,
+            kwargs, bound_args, tracer):
+        if info['remaining'] is not None and not self._count_down(label, info):
+            return
+        if tracer is not None:
+            tracer.begin(label, 'exception', priority)
+        try:
+            callback = info['function']
+            if info['takes_bound_args']:
+                callback(exception, count, bound_args)
+            elif info['takes_target_args']:
+                callback(exception, count, *args, **kwargs)
+            else:
+                callback(exception, count)
+        finally:
+            if tracer is not None:
+                tracer.end(label, 'exception', priority)
+
+    def flush_aggregated_exceptions(self):
+        '''
+            Calls every callback registered with an aggregate_window for the
+        exceptions it has not been told about yet, instead of waiting for
+        their windows to close.
+        Returns:
+            None
+        '''
+        now = self._now()
+        tracer = self._get_tracer()
+        for priority, label, info in self._plan('exception'):
+            if info['aggregate_window'] is None or info['remaining'] == 0:
+                continue
+            due = []
+            with _timer_lock:
+                for group in info['aggregates'].values():
+                    if group[1]:
+                        due.append(group[1:])
+                        group[:] = [now, 0, None, None, None, None]
+                self._prune_aggregates(info, now)
+            for count, exception, args, kwargs, bound_args in due:
+                self._report_aggregate(priority, label, info, exception,
+                        count, args, kwargs, bound_args, tracer)
+
+    def _run_exception_callback(self, info, exception, args, kwargs,
+            bound_args):
+        callback = info['function']
+        takes_target_args = info['takes_target_args']
+        takes_bound_args = info['takes_bound_args']
+        if info['handles_exception']:
+            if takes_bound_args:
+                return callback(exception, bound_args)
+            elif takes_target_args:
+                return callback(exception, *args, **kwargs)
+            else:
+                return callback(exception)
+        elif takes_bound_args:
+            callback(bound_args)
+        elif takes_target_args:
+            callback(*args, **kwargs)
+        else:
+            callback()
+
+    def _call_post_callbacks(self, target_result, args, kwargs,
+            bound_args=None, started=None, tracer=None):
+        deadline = self._deadline(started)
+        queue = getattr(_deferred_state, 'queue', None)
+        timed = self._demotion is not None
+        for priority, label, info in self._plan('post'):
+            remaining = info['remaining']
+            if remaining == 0:
+                # expired, see _expire
+                continue
+            if (deadline is not None and priority < self._shed_below and
+                    _clock() > deadline):
+                self.shed_counts[label] = self.shed_counts.get(label, 0) + 1
+                continue
+            if info['throttle'] is not None or info['debounce'] is not None:
+                self._rate_limit(label, info, self._run_post_callback,
+                        (target_result, args, kwargs, bound_args))
+                continue
+            if queue is not None:
+                # counted down when the queue is drained
+                self._defer_post_callback(queue, label, target_result,
+                        args, kwargs, bound_args)
+                continue
+            if remaining is not None and not self._count_down(label, info):
+                continue
+            if info['demoted'] == 'background':
+                _run_in_background(self._run_post_callback, info,
+                        target_result, args, kwargs, bound_args)
+                continue
+            if timed:
+                callback_started = _clock()
+            if tracer is None:
+                self._run_post_callback(info, target_result, args, kwargs,
+                        bound_args)
+            else:
+                tracer.begin(label, 'post', priority)
+                try:
+                    self._run_post_callback(info, target_result, args,
+                            kwargs, bound_args)
+                finally:
+                    tracer.end(label, 'post', priority)
+            if timed:
+                self._update_runtime(label, info, _clock() - callback_started)
+
+    def _run_post_callback(self, info, target_result, args, kwargs,
+            bound_args):
+        callback = info['function']
+        takes_target_args = info['takes_target_args']
+        takes_bound_args = info['takes_bound_args']
+        takes_target_result = info['takes_target_result']
+        if takes_bound_args and takes_target_result:
+            callback(target_result, bound_args)
+        elif takes_target_args and takes_target_result:
+            callback(target_result, *args, **kwargs)
+        elif takes_target_result:
+            callback(target_result)
+        elif takes_bound_args:
+            callback(bound_args)
+        elif takes_target_args:
+            callback(*args, **kwargs)
+        else:
+            callback()
+
+    def _defer_post_callback(self, queue, label, target_result, args, kwargs,
+            bound_args):
+        info = self.callbacks[label]
+        defer_key = info['defer_key']
+        if defer_key is None:
+            key = (self, label, None)
+        else:
+            key = (self, label, defer_key(*args, **kwargs))
+        if key in queue:
+            # keep the original queue position, but run with the latest call
+            queue[key][2:] = [target_result, args, kwargs, bound_args]
+        else:
+            queue[key] = [info['priority'], len(queue),
+                    target_result, args, kwargs, bound_args]
+
+    def _run_deferred_post_callback(self, label, target_result, args, kwargs,
+            bound_args):
+        # the callback may have been removed while it was queued
+        info = self.callbacks.get(label)
+        if info is None:
+            return
+        if info['remaining'] is not None and not self._count_down(label, info):
+            return
+        tracer = self._get_tracer()
+        if tracer is None:
+            self._run_post_callback(info, target_result, args, kwargs,
+                    bound_args)
+        else:
+            tracer.begin(label, 'post', info['priority'])
+            try:
+                self._run_post_callback(info, target_result, args, kwargs,
+                        bound_args)
+            finally:
+                tracer.end(label, 'post', info['priority'])
+
+def _check_rate_limit(throttle, debounce):
+    if throttle is not None and debounce is not None:
+        raise ValueError('Only one of throttle and debounce can be set.')
+    limits = []
+    for name, value in (('Throttle', throttle), ('Debounce', debounce)):
+        if value is not None:
+            try:
+                value = float(value)
+            except:
+                raise ValueError('%s could not be cast into a float.' % name)
+            if value <= 0:
+                raise ValueError('%s must be greater than 0.' % name)
+        limits.append(value)
+    return limits
+
+def _call_later(delay, function):
+    # default scheduler, see SupportsCallbacks.set_scheduler
+    import threading
+    timer = threading.Timer(delay, function)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def _run_in_background(function, *args):
+    global _background_queue, _background_pid
+    pid = getpid()
+    if _background_pid != pid:
+        with _background_lock:
+            if _background_pid != pid:
+                _background_queue = _start_background_worker()
+                _background_pid = pid
+    _background_queue.put((function, args))
+
+def _start_background_worker():
+    import Queue
+    import threading
+    queue = Queue.Queue()
+    worker = threading.Thread(target=_background_worker, args=(queue,),
+            name='callbacks-background')
+    worker.daemon = True
+    worker.start()
+    return queue
+
+def _background_worker(queue):
+    while True:
+        function, args = queue.get()
+        try:
+            function(*args)
+        except Exception:
+            import logging
+            logging.getLogger('callbacks').exception(
+                    'Background callback %r failed', args[0]['function'])
+        finally:
+            queue.task_done()
+
+def wait_for_background_callbacks():
+    '''
+        Blocks until every callback that was demoted to the background (see
+    SupportsCallbacks.set_demotion_policy) and has been queued so far has
+    run.
+    '''
+    # after a fork, the inherited queue has no worker to drain it
+    if _background_pid == getpid():
+        _background_queue.join()
+
+@contextmanager
+def deferred():
+    '''
+        Within this context, post callbacks are queued instead of being run
+    when their target returns.  When the outermost deferred() context exits,
+    the queue is deduplicated and each remaining callback is run once (with
+    the arguments and result of the latest call), in priority order.
+    Duplicates are detected per target by (label, key), where key is the
+    value returned by the callback's <defer_key> (see add_post_callback) or
+    None.  The queue is kept per thread and is drained even if the context
+    exits with an exception.
+    '''
+    if getattr(_deferred_state, 'queue', None) is not None:
+        # nested scopes are folded into the outermost one
+        yield
+        return
+
+    queue = {}
+    _deferred_state.queue = queue
+    try:
+        yield
+    finally:
+        # callbacks that trigger more callbacks while draining run right away
+        _deferred_state.queue = None
+        entries = sorted(queue.iteritems(),
+                key=lambda item: (-item[1][0], item[1][1]))
+        for (owner, label, _), entry in entries:
+            owner._run_deferred_post_callback(label, *entry[2:])
+
+def _exception_key(exception):
+    '''
+        Returns a key that is the same for exceptions of the same type, with
+    the same message, raised from the same place.
+    '''
+    try:
+        message = str(exception)
+    except Exception:
+        message = repr(exception)
+    location = None
+    exc_type, exc_value, traceback = sys.exc_info()
+    if exc_value is exception and traceback is not None:
+        while traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        location = (traceback.tb_frame.f_code.co_filename,
+                traceback.tb_lineno)
+    return (type(exception), message, location)
+
+def _make_binder(target, skip_first=False):
+    '''
+        Inspects the signature of <target> once and returns a function that
+    maps (args, kwargs) onto a dictionary of parameter name -> value, with
+    defaults applied.  Extra positional and keyword arguments are collected
+    under the names of the *args and **kwargs parameters, if any.
+    '''
+    import inspect
+
+    names, varargs, varkw, defaults = inspect.getargspec(target)
+    if defaults:
+        default_items = zip(names[-len(defaults):], defaults)
+    else:
+        default_items = []
+    if skip_first:
+        default_items = [(name, default) for name, default in default_items
+                if name != names[0]]
+        names = names[1:]
+    names = tuple(names)
+    default_items = tuple(default_items)
+    name_set = frozenset(names)
+    num_names = len(names)
+
+    def bind(args, kwargs):
+        bound_args = dict(zip(names, args))
+        if varargs is not None:
+            bound_args[varargs] = tuple(args[num_names:])
+        if varkw is None:
+            bound_args.update(kwargs)
+        else:
+            extra_kwargs = {}
+            for key, value in kwargs.iteritems():
+                if key in name_set:
+                    bound_args[key] = value
                 else:
-                    callback()
+                    extra_kwargs[key] = value
+            bound_args[varkw] = extra_kwargs
+        for name, default in default_items:
+            if name not in bound_args:
+                bound_args[name] = default
+        return bound_args
+    return bind
+
+class _LazyBoundMethod(object):
+    # What <instance>.<method> evaluates to, for methods decorated with
+    # supports_callbacks_on_methods.  Calling it runs the instance's
+    # callbacks for the method if it has any, otherwise only the callbacks
+    # registered on the method.  The attributes of a bound method are
+    # answered directly; looking up any other attribute (add_pre_callback,
+    # ...) creates the instance's registry for the method and returns the
+    # attribute of the registry bound to the instance.  Like bound methods,
+    # two of them are equal if they bind the same method to the same
+    # instance, so they can be used as labels.  (This is a comment rather
+    # than a docstring because __doc__ is the method's docstring.)
+    __slots__ = ('_method', '_instance', '_cls')
+
+    def __init__(self, method, instance, cls):
+        self._method = method
+        self._instance = instance
+        self._cls = cls
+
+    def __repr__(self):
+        return '<bound method %s.%s of %r>' % (type(self._instance).__name__,
+                self._method.target.__name__, self._instance)
+
+    def __eq__(self, other):
+        return (isinstance(other, _LazyBoundMethod) and
+                other._method is self._method and
+                other._instance is self._instance)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._method, id(self._instance)))
+
+    @property
+    def __doc__(self):
+        return self._method.__doc__
+
+    @property
+    def __name__(self):
+        return self._method.target.__name__
+
+    @property
+    def im_self(self):
+        return self._instance
+
+    __self__ = im_self
+
+    @property
+    def im_func(self):
+        return self._method
+
+    __func__ = im_func
+
+    @property
+    def im_class(self):
+        return self._cls
+
+    def __call__(self, *args, **kwargs):
+        # the registry may have been created through this object
+        proxies = _find_instance_store(self._instance)
+        if proxies is not None and self._method in proxies:
+            return proxies[self._method](self._instance, *args, **kwargs)
+        return self._method(self._instance, *args, **kwargs)
+
+    def __getattr__(self, name):
+        proxy = self._method._get_stored_proxy(self._instance)
+        return getattr(MethodType(proxy, self._instance, self._cls), name)
+
+class _InstanceStore(dict):
+    '''
+        Maps decorated methods to the proxies of the instance it is held by
+    (see _get_instance_store).  It remembers which instance it belongs to,
+    because copying an instance copies the attribute holding it: a copy
+    finds a store that is not its own and starts a new one.  It pickles (and
+    deep copies) as an empty store.
+    '''
+    __slots__ = ('_owner',)
+
+    def __init__(self, instance=None):
+        dict.__init__(self)
+        if instance is None:
+            self._owner = None
+        else:
+            try:
+                self._owner = ref(instance)
+            except TypeError:
+                # slotted classes without __weakref__
+                self._owner = id(instance)
+
+    def __reduce__(self):
+        return (_InstanceStore, ())
+
+    def belongs_to(self, instance):
+        owner = self._owner
+        if isinstance(owner, ref):
+            return owner() is instance
+        return owner == id(instance)
+
+def _find_instance_store(instance):
+    '''
+        Returns the _InstanceStore of <instance>, or None if it has none
+    (see _get_instance_store).
+    '''
+    proxies = getattr(instance, CALLBACKS_SLOT, None)
+    if proxies is not None and proxies.belongs_to(instance):
+        return proxies
+    return None
+
+def _get_instance_store(instance):
+    '''
+        Returns the _InstanceStore, held in the CALLBACKS_SLOT attribute of
+    <instance>, that maps each decorated method to the instance's proxy for
+    it, creating it if needed.
+    '''
+    proxies = _find_instance_store(instance)
+    if proxies is None:
+        proxies = _InstanceStore(instance)
+        setattr(instance, CALLBACKS_SLOT, proxies)
+    return proxies
 
 def supports_callbacks(target=None):
     """
@@ -380,3 +1769,46 @@ def supports_callbacks(target=None):
         return SupportsCallbacks(target)
     else:
         return SupportsCallbacks
+
+def supports_callbacks_on_methods(cls=None, include=None, exclude=()):
+    """
+        This is a class decorator.  It makes the methods of the class support
+    callbacks, as if each of them had been decorated with
+    @supports_callbacks, except that every instance keeps the callback
+    registries of all its methods in a single dictionary (in its
+    CALLBACKS_SLOT attribute) instead of each method keeping a weak table of
+    instances.  An instance's registry for a method is only created when
+    callbacks are added to (or looked up on) <instance>.<method>; until
+    then calling the method only runs the callbacks registered on the
+    method itself.  Copies and unpickled instances start without callbacks
+    of their own, like instances of classes using @supports_callbacks.
+    Instances without a __dict__ (and without CALLBACKS_SLOT
+    in their __slots__) fall back to the default behavior.
+
+    Inputs:
+        include: Names of the methods to decorate, or None to decorate all
+            public methods (names not starting with an underscore) defined
+            in the class body.
+        exclude: Names of methods not to decorate.
+    """
+    if cls is None:
+        # @supports_callbacks_on_methods(...) syntax
+        return partial(supports_callbacks_on_methods, include=include,
+                exclude=exclude)
+
+    if include is None:
+        names = [name for name, value in vars(cls).items()
+                if not name.startswith('_') and
+                isinstance(value, FunctionType)]
+    else:
+        names = list(include)
+    for name in names:
+        if name in exclude:
+            continue
+        function = vars(cls).get(name)
+        if not isinstance(function, FunctionType):
+            raise ValueError('%r is not a method defined by %s.' %
+                    (name, cls.__name__))
+        setattr(cls, name, SupportsCallbacks(function,
+                store_on_instance=True))
+    return cls
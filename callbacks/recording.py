@@ -0,0 +1,109 @@
+import cPickle
+import struct
+import time
+
+# every record is prefixed with its length
+_LENGTH = struct.Struct('<I')
+_MAGIC = 'CBRL\x01'
+
+def _dumps(record):
+    return cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL)
+
+_loads = cPickle.loads
+
+class CallRecorder(object):
+    '''
+        Records every call of a decorated function/method into an
+    append-only binary log, to be replayed later with replay().  Each record
+    holds (args, kwargs, outcome, value, started, duration) where <outcome>
+    is 'result' or 'exception' and <value> is the returned value or the
+    exception raised.  Records are serialized with <dumps> (cPickle by
+    default) and written through a buffer of <buffer_size> bytes, so call
+    flush() or close() before reading the log.  Calls whose record cannot be
+    serialized are counted in <dropped> instead of being written.  Attach a
+    recorder with <target>.set_recorder(recorder).
+    '''
+    def __init__(self, path, dumps=_dumps, buffer_size=65536, append=False):
+        self.path = path
+        self._dumps = dumps
+        self.recorded = 0
+        self.dropped = 0
+        if append:
+            self._file = open(path, 'ab', buffer_size)
+            if self._file.tell() == 0:
+                self._file.write(_MAGIC)
+        else:
+            self._file = open(path, 'wb', buffer_size)
+            self._file.write(_MAGIC)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.path)
+
+    def record(self, args, kwargs, outcome, value, started, duration):
+        try:
+            payload = self._dumps((args, kwargs, outcome, value, started,
+                    duration))
+        except Exception:
+            self.dropped += 1
+            return
+        self._file.write(_LENGTH.pack(len(payload)) + payload)
+        self.recorded += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_records(path, loads=_loads):
+    '''
+        Yields the records written to <path> by a CallRecorder, oldest first.
+    A record that was cut short (e.g. because the recording process died)
+    ends the log.
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError('%s is not a call recording.' % path)
+        while True:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            length, = _LENGTH.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield loads(payload)
+
+def replay(path, target, loads=_loads):
+    '''
+        Calls <target> once for every record in the log at <path>, with the
+    recorded args and kwargs, so the target and all its callbacks run
+    against recorded traffic.  Exceptions raised by the calls are counted,
+    not propagated.
+    Inputs:
+        path: A log written by a CallRecorder.
+        target: The decorated function, or a method bound to the instance
+            the calls should be made on.
+    Returns:
+        A dictionary with the number of 'calls' made, the number of them
+        that raised ('errors') and the total time taken in seconds
+        ('elapsed').
+    '''
+    calls = 0
+    errors = 0
+    elapsed = 0.0
+    for args, kwargs, _, _, _, _ in read_records(path, loads):
+        started = time.time()
+        try:
+            target(*args, **kwargs)
+        except Exception:
+            errors += 1
+        elapsed += time.time() - started
+        calls += 1
+    return {'calls': calls, 'errors': errors, 'elapsed': elapsed}
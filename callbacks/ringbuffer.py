@@ -0,0 +1,199 @@
+import cPickle
+import mmap
+import struct
+import time
+try:
+    from thread import allocate_lock
+except ImportError:
+    from threading import Lock as allocate_lock
+
+# magic, version, capacity, slot size, write sequence, read sequence, dropped
+_HEADER = struct.Struct('<4sIIIQQQ')
+_HEADER_SIZE = 64
+_MAGIC = 'CBRB'
+_VERSION = 1
+_WRITE_SEQ_OFFSET = 16
+_READ_SEQ_OFFSET = 24
+_DROPPED_OFFSET = 32
+# slot sequence number (0 while the slot is being written) and record length
+_SLOT_HEADER = struct.Struct('<QI')
+_SEQ = struct.Struct('<Q')
+
+def _dumps(record):
+    return cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL)
+
+_loads = cPickle.loads
+
+class RingBufferSink(object):
+    '''
+        Publishes post-call events from decorated functions/methods to other
+    processes through a fixed-size ring buffer in a memory mapped file (put
+    it on a tmpfs such as /dev/shm to keep it in shared memory).  Each event
+    is a (label, args, kwargs, result, timestamp) record, read with a
+    RingBufferReader.  Writing never blocks: when the buffer is full the
+    oldest records are overwritten (overwrite=True) or the new record is
+    dropped (overwrite=False).  Records that do not fit in a slot are always
+    dropped.  Any thread may write (attach() makes every thread calling the
+    target a writer), but there must be only one RingBufferSink per buffer.
+    '''
+    def __init__(self, path, capacity=1024, slot_size=512, overwrite=True,
+            dumps=_dumps):
+        if capacity < 1:
+            raise ValueError('Capacity must be at least 1.')
+        if slot_size <= _SLOT_HEADER.size:
+            raise ValueError('Slot size must be larger than %d bytes.' %
+                    _SLOT_HEADER.size)
+        self.path = path
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.overwrite = overwrite
+        self._dumps = dumps
+        self._max_length = slot_size - _SLOT_HEADER.size
+        self._write_seq = 0
+        # serializes writers, see write()
+        self._lock = allocate_lock()
+        self.dropped = 0
+
+        size = _HEADER_SIZE + capacity * slot_size
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, capacity, slot_size,
+                0, 0, 0)
+
+    def __repr__(self):
+        return "%s(%r, capacity=%r, slot_size=%r)" % (self.__class__.__name__,
+                self.path, self.capacity, self.slot_size)
+
+    def attach(self, target, label=None, priority=0):
+        '''
+            Registers a post callback on <target> that writes a record for
+        every call.  Records carry <label>, which is also the label of the
+        callback (defaults to the name of the target).
+        Returns:
+            label
+        '''
+        if label is None:
+            label = target.target.__name__
+
+        def callback(target_result, *args, **kwargs):
+            self.write((label, args, kwargs, target_result, time.time()))
+
+        return target.add_post_callback(callback, label=label,
+                priority=priority, takes_target_args=True,
+                takes_target_result=True)
+
+    def write(self, record):
+        '''
+            Writes <record> to the buffer.  Records that cannot be serialized
+        are dropped rather than raising to the caller.
+        Returns:
+            True if the record was written, False if it was dropped.
+        '''
+        try:
+            payload = self._dumps(record)
+        except Exception:
+            payload = None
+        with self._lock:
+            seq = self._write_seq
+            if payload is None or len(payload) > self._max_length or (
+                    not self.overwrite and seq - _SEQ.unpack_from(self._map,
+                    _READ_SEQ_OFFSET)[0] >= self.capacity):
+                self.dropped += 1
+                _SEQ.pack_into(self._map, _DROPPED_OFFSET, self.dropped)
+                return False
+
+            offset = _HEADER_SIZE + (seq % self.capacity) * self.slot_size
+            # readers ignore the slot while its sequence number is 0
+            _SLOT_HEADER.pack_into(self._map, offset, 0, len(payload))
+            start = offset + _SLOT_HEADER.size
+            self._map[start:start + len(payload)] = payload
+            _SEQ.pack_into(self._map, offset, seq + 1)
+
+            self._write_seq = seq + 1
+            _SEQ.pack_into(self._map, _WRITE_SEQ_OFFSET, seq + 1)
+        return True
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RingBufferReader(object):
+    '''
+        Reads the records written by a RingBufferSink, possibly in another
+    process.  Records that were overwritten before they could be read are
+    counted in <lost>, records the writer dropped are counted in <dropped>.
+    '''
+    def __init__(self, path, from_start=True, loads=_loads):
+        self.path = path
+        self._loads = loads
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        (magic, version, self.capacity, self.slot_size, write_seq, _,
+                _) = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError('%s is not a ring buffer.' % path)
+        if from_start:
+            self._next = max(0, write_seq - self.capacity)
+        else:
+            self._next = write_seq
+        self.lost = 0
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.path)
+
+    @property
+    def dropped(self):
+        return _SEQ.unpack_from(self._map, _DROPPED_OFFSET)[0]
+
+    def read(self, max_records=None):
+        '''
+            Returns a list of the records written since the last read,
+        oldest first (at most <max_records> of them).
+        '''
+        records = []
+        write_seq = _SEQ.unpack_from(self._map, _WRITE_SEQ_OFFSET)[0]
+        while self._next < write_seq:
+            if max_records is not None and len(records) >= max_records:
+                break
+            if write_seq - self._next > self.capacity:
+                # the writer has lapped us
+                self.lost += write_seq - self.capacity - self._next
+                self._next = write_seq - self.capacity
+
+            offset = _HEADER_SIZE + (self._next % self.capacity) * \
+                    self.slot_size
+            seq, length = _SLOT_HEADER.unpack_from(self._map, offset)
+            start = offset + _SLOT_HEADER.size
+            payload = self._map[start:start + length]
+            if (seq != self._next + 1 or
+                    _SEQ.unpack_from(self._map, offset)[0] != seq):
+                # overwritten before or while we read it
+                write_seq = _SEQ.unpack_from(self._map, _WRITE_SEQ_OFFSET)[0]
+                if write_seq - self._next <= self.capacity:
+                    self.lost += 1
+                    self._next += 1
+                continue
+
+            records.append(self._loads(payload))
+            self._next += 1
+
+        _SEQ.pack_into(self._map, _READ_SEQ_OFFSET, self._next)
+        return records
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,129 @@
+import importlib
+
+SNAPSHOT_VERSION = 1
+
+# label types that survive a round trip through json (or repr/literal_eval)
+_LABEL_TYPES = (basestring, int, long, float, bool)
+
+def snapshot(targets):
+    '''
+        Exports the callbacks registered on <targets> as a dictionary that
+    only contains strings, numbers, booleans, lists and dictionaries, so it
+    can be serialized with json (for example) and later passed to restore().
+    Callback functions (and defer_key functions) are recorded by their import
+    path, so they must be module level functions.  Each distinct import path
+    and each distinct set of options is stored only once.
+    Inputs:
+        targets: A dictionary mapping a name of your choosing to each
+            decorated function/method whose callbacks should be exported.
+    Returns:
+        snapshot dictionary
+    '''
+    callback_paths = []
+    callback_indexes = {}
+    flag_sets = []
+    flag_indexes = {}
+    exported = {}
+    for name, target in targets.items():
+        rows = []
+        for type, priority, label, info in target._registrations():
+            callback = info.pop('function')
+            del info['type']
+            del info['priority']
+            for key, value in info.items():
+                if callable(value):
+                    info[key] = {'import': _import_path(value)}
+            if label is callback:
+                label = None
+            elif not isinstance(label, _LABEL_TYPES):
+                raise ValueError('Cannot snapshot callback with label %r on '
+                        '"%s", labels must be strings or numbers.' %
+                        (label, name))
+
+            path = _import_path(callback)
+            if path not in callback_indexes:
+                callback_indexes[path] = len(callback_paths)
+                callback_paths.append(path)
+            flags_key = repr(sorted(info.items()))
+            if flags_key not in flag_indexes:
+                flag_indexes[flags_key] = len(flag_sets)
+                flag_sets.append(info)
+
+            rows.append([type, priority, label, callback_indexes[path],
+                    flag_indexes[flags_key]])
+        exported[name] = rows
+    return {'version': SNAPSHOT_VERSION,
+            'callbacks': callback_paths,
+            'flags': flag_sets,
+            'targets': exported}
+
+def restore(snapshot, targets):
+    '''
+        Replaces the callbacks registered on <targets> with the ones recorded
+    in <snapshot> (see snapshot()).  Each target's registration is rebuilt in
+    a single step instead of replaying add_*_callback calls.  Targets that
+    are not in the snapshot are left untouched.
+    Inputs:
+        snapshot: A dictionary returned by snapshot().
+        targets: A dictionary mapping the names used when taking the
+            snapshot to decorated functions/methods.
+    Returns:
+        None
+    '''
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported snapshot version: %r' %
+                snapshot.get('version'))
+
+    missing = [name for name in snapshot['targets'] if name not in targets]
+    if missing:
+        raise RuntimeError('No targets supplied for snapshot entries %s' %
+                sorted(missing))
+
+    # resolve everything first so a bad snapshot leaves all targets untouched
+    imported = {}
+    callbacks = [_resolve(path, imported) for path in snapshot['callbacks']]
+    flag_sets = []
+    for flags in snapshot['flags']:
+        info = {}
+        for key, value in flags.items():
+            if isinstance(value, dict) and 'import' in value:
+                value = _resolve(value['import'], imported)
+            info[str(key)] = value
+        flag_sets.append(info)
+
+    resolved = {}
+    for name, rows in snapshot['targets'].items():
+        registrations = []
+        for type, priority, label, callback_index, flags_index in rows:
+            callback = callbacks[callback_index]
+            info = dict(flag_sets[flags_index], function=callback,
+                    type=type, priority=priority)
+            if label is None:
+                label = callback
+            registrations.append((type, priority, label, info))
+        resolved[name] = registrations
+
+    for name, registrations in resolved.items():
+        targets[name]._restore_registrations(registrations)
+
+def _import_path(function):
+    module = getattr(function, '__module__', None)
+    name = getattr(function, '__name__', None)
+    if module is None or name is None:
+        raise ValueError('Cannot snapshot %r, it has no import path.' %
+                function)
+    path = '%s:%s' % (module, name)
+    try:
+        importable = _resolve(path, {}) is function
+    except (ImportError, AttributeError):
+        importable = False
+    if not importable:
+        raise ValueError('Cannot snapshot %r, it is not importable as %s' %
+                (function, path))
+    return path
+
+def _resolve(path, cache):
+    if path not in cache:
+        module_name, name = path.split(':')
+        cache[path] = getattr(importlib.import_module(module_name), name)
+    return cache[path]
@@ -0,0 +1,86 @@
+import itertools
+import json
+import os
+import time
+
+try:
+    from thread import get_ident
+except ImportError:
+    from threading import get_ident
+
+# Python 2 has no monotonic clock in the standard library
+_now = getattr(time, 'monotonic', time.time)
+
+class Tracer(object):
+    '''
+        Records begin/end events for target calls and callback runs into a
+    ring buffer that is allocated up front.  Once <capacity> events have
+    been recorded the oldest ones are overwritten.  Attach a tracer to a
+    decorated function or method with <target>.set_tracer(tracer) and export
+    what was recorded with to_chrome_trace() or write(), the result can be
+    loaded into chrome://tracing or any other trace-event viewer.
+    '''
+    def __init__(self, capacity=65536):
+        if capacity < 1:
+            raise ValueError('Capacity must be at least 1.')
+        self.capacity = capacity
+        self.clear()
+
+    def __repr__(self):
+        return "%s(capacity=%r)" % (self.__class__.__name__, self.capacity)
+
+    def clear(self):
+        '''
+            Discards all recorded events.
+        '''
+        self._events = [None] * self.capacity
+        # next() on a count is atomic, so threads never share a slot
+        self._sequence = itertools.count()
+
+    def begin(self, name, type, priority=None):
+        sequence = next(self._sequence)
+        self._events[sequence % self.capacity] = (sequence, 'B', name, type,
+                priority, get_ident(), _now())
+
+    def end(self, name, type, priority=None):
+        sequence = next(self._sequence)
+        self._events[sequence % self.capacity] = (sequence, 'E', name, type,
+                priority, get_ident(), _now())
+
+    def events(self):
+        '''
+            Returns the recorded events, oldest first, as a list of
+        (phase, name, type, priority, thread id, timestamp) tuples.  Phase is
+        'B' (begin) or 'E' (end), timestamps are in seconds.
+        '''
+        events = sorted(event for event in self._events if event is not None)
+        return [event[1:] for event in events]
+
+    def to_chrome_trace(self):
+        '''
+            Returns the recorded events as a dictionary in the Chrome
+        trace-event format.  Callback events have a category of 'pre',
+        'post' or 'exception', target events have a category of 'target'.
+        '''
+        pid = os.getpid()
+        trace_events = []
+        for phase, name, type, priority, thread_id, timestamp in self.events():
+            event = {
+                'name': str(name),
+                'cat': type,
+                'ph': phase,
+                'ts': timestamp * 1e6,
+                'pid': pid,
+                'tid': thread_id,
+            }
+            if priority is not None:
+                event['args'] = {'priority': priority}
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        '''
+            Writes the recorded events to <path> as Chrome trace-event JSON.
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
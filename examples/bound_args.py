@@ -0,0 +1,12 @@
+from callbacks import supports_callbacks
+
+def print_bound_args(bound_args):
+    print "I got bound args %s" % str(sorted(bound_args.items()))
+
+@supports_callbacks
+def target(name, greeting='hello'):
+    return '%s, %s' % (greeting, name)
+
+target.add_callback(print_bound_args, takes_bound_args=True)
+print "This should print 'I got bound args [('greeting', 'hello'), ('name', 'Polly')]':"
+target('Polly')
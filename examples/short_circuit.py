@@ -0,0 +1,25 @@
+from callbacks import supports_callbacks, ShortCircuit
+
+cache = {}
+
+def lookup(n):
+    if n in cache:
+        print "I found %d in the cache" % n
+        return ShortCircuit(cache[n])
+
+def remember(result, n):
+    cache[n] = result
+
+@supports_callbacks
+def slow_square(n):
+    print "I am computing the square of %d" % n
+    return n * n
+
+slow_square.add_pre_callback(lookup, takes_target_args=True,
+        can_short_circuit=True)
+slow_square.add_post_callback(remember, takes_target_args=True,
+        takes_target_result=True)
+print "This should print 'I am computing the square of 4':"
+slow_square(4)
+print "This should print 'I found 4 in the cache':"
+slow_square(4)
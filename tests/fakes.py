@@ -0,0 +1,52 @@
+'''
+    Test doubles shared by the test modules.
+'''
+from mock import patch
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeTimer(object):
+    def __init__(self, due, function):
+        self.due = due
+        self.function = function
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class FakeScheduler(object):
+    '''
+        A call_later(delay, function) for SupportsCallbacks.set_scheduler
+    that runs nothing until advance() moves <clock> forward.
+    '''
+    def __init__(self, clock):
+        self.clock = clock
+        self.timers = []
+
+    def __call__(self, delay, function):
+        timer = FakeTimer(self.clock.now + delay, function)
+        self.timers.append(timer)
+        return timer
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        while True:
+            due = [timer for timer in self.timers
+                    if timer.due <= self.clock.now and not timer.cancelled]
+            if not due:
+                break
+            timer = min(due, key=lambda timer: timer.due)
+            self.timers.remove(timer)
+            timer.function()
+
+# the clock the tests put in place of callbacks.callbacks._clock, reset
+# clock.now in setUp
+clock = FakeClock()
+
+# class decorator that patches in <clock> for every test of a TestCase
+patch_clock = patch('callbacks.callbacks._clock', clock)
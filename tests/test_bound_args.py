@@ -0,0 +1,123 @@
+import unittest
+
+from callbacks import supports_callbacks
+
+called_with = []
+def callback(*args):
+    called_with.append(args)
+
+@supports_callbacks
+def foo(bar, baz='bone', *args, **kwargs):
+    return (bar, baz)
+
+@supports_callbacks
+def simple(a, b=2):
+    return a + b
+
+class Example(object):
+    @supports_callbacks
+    def method(self, x, y=10):
+        return x + y
+
+class TestBoundArgs(unittest.TestCase):
+    def setUp(self):
+        while called_with:
+            called_with.pop()
+        foo.remove_callbacks()
+        simple.remove_callbacks()
+
+    def test_defaults_applied(self):
+        simple.add_pre_callback(callback, takes_bound_args=True)
+
+        simple(1)
+        simple(1, b=5)
+        simple(b=7, a=3)
+
+        self.assertEqual(called_with, [
+            ({'a': 1, 'b': 2},),
+            ({'a': 1, 'b': 5},),
+            ({'a': 3, 'b': 7},),
+            ])
+
+    def test_varargs_and_varkw(self):
+        foo.add_pre_callback(callback, takes_bound_args=True)
+
+        foo(1, 2, 3, 4, baz2=5)
+        foo(1, qux=6)
+
+        self.assertEqual(called_with, [
+            ({'bar': 1, 'baz': 2, 'args': (3, 4), 'kwargs': {'baz2': 5}},),
+            ({'bar': 1, 'baz': 'bone', 'args': (), 'kwargs': {'qux': 6}},),
+            ])
+
+    def test_post_with_result(self):
+        simple.add_post_callback(callback, takes_bound_args=True,
+                takes_target_result=True)
+
+        simple(1)
+
+        self.assertEqual(called_with, [(3, {'a': 1, 'b': 2})])
+
+    def test_exception_callbacks(self):
+        @supports_callbacks
+        def fails(a, b=None):
+            raise ValueError('boom')
+
+        def handler(exception, bound_args):
+            called_with.append((exception.args, bound_args))
+            return 'handled'
+
+        fails.add_exception_callback(callback, takes_bound_args=True)
+        fails.add_exception_callback(handler, handles_exception=True,
+                takes_bound_args=True)
+
+        self.assertEqual('handled', fails(1))
+        self.assertEqual(called_with, [
+            ({'a': 1, 'b': None},),
+            (('boom',), {'a': 1, 'b': None}),
+            ])
+
+    def test_mapping_shared_between_callbacks(self):
+        simple.add_pre_callback(callback, label='a', takes_bound_args=True)
+        simple.add_post_callback(callback, label='b', takes_bound_args=True)
+
+        simple(1)
+
+        self.assertEqual(len(called_with), 2)
+        self.assertTrue(called_with[0][0] is called_with[1][0])
+
+    def test_method(self):
+        e = Example()
+        e.method.add_post_callback(callback, takes_bound_args=True)
+
+        e.method(1)
+
+        self.assertEqual(called_with, [({'self': e, 'x': 1, 'y': 10},)])
+
+    def test_method_binder_shared_by_instances(self):
+        e1 = Example()
+        e2 = Example()
+        e1.method.add_post_callback(callback, takes_bound_args=True)
+        e2.method.add_post_callback(callback, takes_bound_args=True)
+
+        e1.method(1)
+        binder = Example.method._binder
+        e2.method(2, y=3)
+
+        self.assertTrue(binder is not None)
+        self.assertTrue(Example.method._binder is binder)
+        self.assertTrue(e1.method._binder is None)
+        self.assertTrue(e2.method._binder is None)
+        self.assertEqual(called_with, [({'self': e1, 'x': 1, 'y': 10},),
+                ({'self': e2, 'x': 2, 'y': 3},)])
+
+    def test_exclusive_with_takes_target_args(self):
+        self.assertRaises(ValueError, simple.add_pre_callback, callback,
+                takes_target_args=True, takes_bound_args=True)
+        self.assertEqual(len(simple.callbacks), 0)
+
+    def test_removal(self):
+        label = simple.add_pre_callback(callback, takes_bound_args=True)
+        self.assertEqual(simple._num_bound_args_callbacks, 1)
+        simple.remove_callback(label)
+        self.assertEqual(simple._num_bound_args_callbacks, 0)
@@ -73,6 +73,31 @@ class TestCallbackDecorator(unittest.TestCase):
                                      d        0.0       0   exception        False             N/A'''
         self.assertEquals(expected_string, foo._callbacks_info)
 
+    def test_describe_callbacks(self):
+        foo.add_pre_callback(callback, label='a')
+        foo.add_pre_callback(callback, label='b', takes_target_args=True)
+        foo.add_post_callback(callback, label='c', priority=1.1,
+                takes_target_result=True)
+        foo.add_post_callback(callback, label='d', times=2)
+        foo.add_exception_callback(callback, label='e', handles_exception=True)
+
+        records = foo.describe_callbacks()
+        self.assertEquals([('a', 'pre', 0.0, 0), ('b', 'pre', 0.0, 1),
+                ('c', 'post', 1.1, 0), ('d', 'post', 0.0, 0),
+                ('e', 'exception', 0.0, 0)],
+                [(r['label'], r['type'], r['priority'], r['order'])
+                for r in records])
+        self.assertTrue(all(r['function'] is callback for r in records))
+        self.assertTrue(all(r['origin'] == 'self' for r in records))
+        self.assertTrue(records[1]['flags']['takes_target_args'])
+        self.assertTrue(records[2]['flags']['takes_target_result'])
+        self.assertEquals(2, records[3]['flags']['remaining'])
+        self.assertTrue(records[4]['flags']['handles_exception'])
+
+        foo.remove_callback('a')
+        self.assertEquals([('b', 0)], [(r['label'], r['order'])
+                for r in foo.describe_callbacks() if r['type'] == 'pre'])
+
     def test_with_takes_target_args(self):
         result = foo(10, 20)
         self.assertEquals(result, (10, 20))
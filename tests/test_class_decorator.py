@@ -0,0 +1,190 @@
+import copy
+import gc
+import pickle
+import unittest
+from weakref import ref
+
+from callbacks import supports_callbacks_on_methods, CALLBACKS_SLOT
+from callbacks.callbacks import SupportsCallbacks
+
+called_with = []
+def callback(*args, **kwargs):
+    called_with.append((args, kwargs))
+
+@supports_callbacks_on_methods
+class Example(object):
+    def __init__(self, value):
+        self.value = value
+
+    def first(self, a):
+        '''Adds <a> to the value.'''
+        return self.value + a
+
+    def second(self):
+        return -self.value
+
+    def _private(self):
+        return 'private'
+
+    @staticmethod
+    def static():
+        return 'static'
+
+@supports_callbacks_on_methods(include=['first'])
+class Included(object):
+    def first(self):
+        return 1
+
+    def second(self):
+        return 2
+
+@supports_callbacks_on_methods(exclude=['second'])
+class Excluded(object):
+    def first(self):
+        return 1
+
+    def second(self):
+        return 2
+
+@supports_callbacks_on_methods
+class NoStorage(object):
+    __slots__ = ('__weakref__',)
+
+    def first(self):
+        return 1
+
+class TestClassDecorator(unittest.TestCase):
+    def setUp(self):
+        while called_with:
+            called_with.pop()
+        Example.first.remove_callbacks()
+
+    def test_decorated_methods(self):
+        self.assertTrue(isinstance(vars(Example)['first'], SupportsCallbacks))
+        self.assertTrue(isinstance(vars(Example)['second'],
+                SupportsCallbacks))
+        self.assertFalse(isinstance(vars(Example)['_private'],
+                SupportsCallbacks))
+        self.assertEqual('static', Example.static())
+        self.assertTrue(isinstance(vars(Included)['first'],
+                SupportsCallbacks))
+        self.assertFalse(isinstance(vars(Included)['second'],
+                SupportsCallbacks))
+        self.assertTrue(isinstance(vars(Excluded)['first'],
+                SupportsCallbacks))
+        self.assertFalse(isinstance(vars(Excluded)['second'],
+                SupportsCallbacks))
+
+    def test_bad_include(self):
+        self.assertRaises(ValueError,
+                supports_callbacks_on_methods(include=['missing']), Example)
+
+    def test_shared_store(self):
+        e1 = Example(1)
+        e2 = Example(2)
+        e1.first.add_callback(callback, takes_target_args=True,
+                takes_target_result=True)
+        e1.second.add_callback(callback, takes_target_result=True)
+
+        self.assertEqual(11, e1.first(10))
+        self.assertEqual(-1, e1.second())
+        self.assertEqual(12, e2.first(10))
+        self.assertEqual([((11, e1, 10), {}), ((-1,), {})], called_with)
+
+        store = getattr(e1, CALLBACKS_SLOT)
+        self.assertEqual(set([Example.first, Example.second]),
+                set(store.keys()))
+        self.assertFalse(hasattr(e2, CALLBACKS_SLOT))
+        self.assertEqual(0, len(Example.first._instances))
+
+    def test_store_is_lazy(self):
+        e = Example(1)
+        e.first(1)
+        e.second()
+        self.assertFalse(hasattr(e, CALLBACKS_SLOT))
+
+        method = e.first
+        method.add_callback(callback)
+        self.assertEqual([Example.first], getattr(e, CALLBACKS_SLOT).keys())
+        self.assertEqual(2, method(1))
+        self.assertEqual(1, len(called_with))
+        self.assertTrue(e.first._parent is Example.first)
+
+    def test_class_callbacks(self):
+        Example.first.add_callback(callback, takes_target_result=True)
+        e = Example(1)
+        e.first.add_pre_callback(callback)
+
+        self.assertEqual(3, e.first(2))
+        self.assertEqual([((), {}), ((3,), {})], called_with)
+
+    def test_instance_is_collected(self):
+        e = Example(1)
+        e.first.add_callback(callback)
+        instance_ref = ref(e)
+        del e
+        gc.collect()
+        self.assertTrue(instance_ref() is None)
+
+    def test_fallback(self):
+        n = NoStorage()
+        n.first.add_callback(callback)
+        self.assertEqual(1, n.first())
+        self.assertEqual(1, len(called_with))
+        self.assertEqual(1, len(NoStorage.first._instances))
+
+    def test_method_attributes_are_lazy(self):
+        e = Example(1)
+        method = e.first
+        self.assertTrue('Adds <a> to the value.' in method.__doc__)
+        self.assertEqual('first', method.__name__)
+        self.assertTrue(method.im_self is e)
+        self.assertTrue(method.__self__ is e)
+        self.assertTrue(method.im_func is Example.first)
+        self.assertTrue(method.im_class is Example)
+        self.assertFalse(hasattr(e, CALLBACKS_SLOT))
+
+    def test_bound_method_as_label(self):
+        e = Example(1)
+        other = Example(1)
+        self.assertEqual(e.first, e.first)
+        self.assertEqual(hash(e.first), hash(e.first))
+        self.assertNotEqual(e.first, e.second)
+        self.assertNotEqual(e.first, other.first)
+
+        # registered and removed by the bound method, as with
+        # @supports_callbacks
+        Example.second.add_callback(e.first)
+        self.assertEqual([e.first], Example.second.callbacks.keys())
+        Example.second.remove_callback(e.first)
+        self.assertEqual({}, Example.second.callbacks)
+
+        # equality doesn't change once the instance has a registry
+        method = e.first
+        e.first.add_callback(callback)
+        self.assertEqual(method, e.first)
+        self.assertEqual(hash(method), hash(e.first))
+
+    def test_copy(self):
+        a = Example(1)
+        a.first.add_callback(callback, takes_target_result=True)
+        b = copy.copy(a)
+
+        self.assertEqual(11, b.first(10))
+        self.assertEqual([], called_with)
+        b.first.add_callback(callback, label='copy')
+        self.assertEqual(11, a.first(10))
+        self.assertEqual([((11,), {})], called_with)
+        self.assertEqual(['copy'], b.first.callbacks.keys())
+
+        self.assertEqual(11, copy.deepcopy(a).first(10))
+        self.assertEqual(1, len(called_with))
+
+    def test_pickle(self):
+        a = Example(1)
+        a.first.add_callback(callback)
+        b = pickle.loads(pickle.dumps(a, pickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(3, b.first(2))
+        self.assertEqual([], called_with)
+
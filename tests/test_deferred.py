@@ -0,0 +1,110 @@
+import unittest
+
+import callbacks
+from callbacks import supports_callbacks
+
+called_with = []
+def callback(*args, **kwargs):
+    called_with.append((args, kwargs))
+
+called_order = []
+def cb1(*args, **kwargs):
+    called_order.append('cb1')
+def cb2(*args, **kwargs):
+    called_order.append('cb2')
+
+@supports_callbacks
+def foo(bar, baz='bone'):
+    return (bar, baz)
+
+class TestDeferred(unittest.TestCase):
+    def setUp(self):
+        while called_with:
+            called_with.pop()
+        while called_order:
+            called_order.pop()
+        foo.remove_callbacks()
+
+    def test_coalesced(self):
+        foo.add_post_callback(callback, takes_target_args=True)
+
+        with callbacks.deferred():
+            foo(1)
+            foo(2)
+            foo(3, baz=4)
+            self.assertEqual(called_with, [])
+
+        # runs once, with the latest call
+        self.assertEqual(called_with, [((3,), {'baz': 4})])
+
+        foo(5)
+        self.assertEqual(called_with, [((3,), {'baz': 4}), ((5,), {})])
+
+    def test_defer_key(self):
+        foo.add_post_callback(callback, takes_target_args=True,
+                takes_target_result=True, defer_key=lambda bar, **kw: bar)
+
+        with callbacks.deferred():
+            foo(1)
+            foo(2)
+            foo(1, baz='x')
+
+        self.assertEqual(called_with, [
+            (((1, 'x'), 1), {'baz': 'x'}),
+            (((2, 'bone'), 2), {}),
+            ])
+
+    def test_priority_order(self):
+        foo.add_post_callback(cb1, priority=0)
+        foo.add_post_callback(cb2, priority=1)
+
+        @supports_callbacks
+        def other():
+            pass
+        other.add_post_callback(cb1, priority=2)
+
+        with callbacks.deferred():
+            foo(1)
+            other()
+            foo(2)
+            self.assertEqual(called_order, [])
+
+        self.assertEqual(called_order, ['cb1', 'cb2', 'cb1'])
+
+    def test_pre_callbacks_not_deferred(self):
+        foo.add_pre_callback(cb1)
+
+        with callbacks.deferred():
+            foo(1)
+            self.assertEqual(called_order, ['cb1'])
+
+    def test_nested(self):
+        foo.add_post_callback(cb1)
+
+        with callbacks.deferred():
+            with callbacks.deferred():
+                foo(1)
+            foo(2)
+            self.assertEqual(called_order, [])
+
+        self.assertEqual(called_order, ['cb1'])
+
+    def test_removed_while_queued(self):
+        label = foo.add_post_callback(cb1)
+
+        with callbacks.deferred():
+            foo(1)
+            foo.remove_callback(label)
+
+        self.assertEqual(called_order, [])
+
+    def test_drained_on_exception(self):
+        foo.add_post_callback(cb1)
+
+        def run():
+            with callbacks.deferred():
+                foo(1)
+                raise KeyError
+
+        self.assertRaises(KeyError, run)
+        self.assertEqual(called_order, ['cb1'])
@@ -0,0 +1,144 @@
+import logging
+import threading
+import unittest
+
+from mock import patch
+
+from callbacks import (supports_callbacks, ShortCircuit,
+        wait_for_background_callbacks)
+
+from fakes import clock, patch_clock
+
+called_order = []
+
+def callback(name, runtime):
+    def callback():
+        called_order.append((name, threading.current_thread().name))
+        clock.now += runtime
+    return callback
+
+@supports_callbacks
+def foo():
+    called_order.append(('foo', threading.current_thread().name))
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+@patch_clock
+class TestDemotion(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        clock.now = 0.0
+        foo.remove_callbacks()
+        foo.set_demotion_policy(None)
+        self.handler = RecordingHandler()
+        logging.getLogger('callbacks').addHandler(self.handler)
+        self.main = threading.current_thread().name
+
+    def tearDown(self):
+        logging.getLogger('callbacks').removeHandler(self.handler)
+
+    def test_no_policy(self):
+        foo.add_post_callback(callback('slow', 1.0), label='slow')
+
+        foo()
+        foo()
+        self.assertEqual({}, foo.demoted_callbacks())
+        self.assertEqual([('foo', self.main), ('slow', self.main)] * 2,
+                called_order)
+
+    def test_background(self):
+        foo.set_demotion_policy(0.1, alpha=0.5)
+        foo.add_post_callback(callback('slow', 1.0), label='slow')
+        foo.add_post_callback(callback('fast', 0.01), label='fast')
+
+        foo()
+        self.assertEqual({'slow': ('background', 1.0)},
+                foo.demoted_callbacks())
+        self.assertEqual(1, len(self.handler.messages))
+        self.assertTrue("'slow'" in self.handler.messages[0])
+
+        del called_order[:]
+        foo()
+        wait_for_background_callbacks()
+        self.assertEqual([('foo', self.main), ('fast', self.main)],
+                called_order[:2])
+        self.assertEqual('slow', called_order[2][0])
+        self.assertNotEqual(self.main, called_order[2][1])
+
+    def test_background_after_fork(self):
+        foo.set_demotion_policy(0.1, alpha=0.5)
+        foo.add_post_callback(callback('slow', 1.0), label='slow')
+        foo()
+        foo()
+        wait_for_background_callbacks()
+
+        del called_order[:]
+        # as seen by a forked child: a queue left behind by the parent's
+        # worker, which did not survive the fork
+        with patch('callbacks.callbacks._background_pid', -1):
+            wait_for_background_callbacks()
+            foo()
+            wait_for_background_callbacks()
+        self.assertEqual('slow', called_order[1][0])
+        self.assertNotEqual(self.main, called_order[1][1])
+
+    def test_moving_average(self):
+        foo.set_demotion_policy(0.6, alpha=0.5, action='flag')
+        runtimes = [1.0, 1.0, 0.0]
+        def varying():
+            clock.now += runtimes.pop()
+        foo.add_pre_callback(varying, label='varying')
+
+        foo()
+        foo()
+        self.assertEqual({}, foo.demoted_callbacks())
+        foo()
+        self.assertEqual({'varying': ('flag', 0.75)}, foo.demoted_callbacks())
+
+    def test_flag(self):
+        foo.set_demotion_policy(0.1, action='flag')
+        foo.add_pre_callback(callback('slow', 1.0), label='slow')
+
+        foo()
+        foo()
+        self.assertEqual('flag', foo.demoted_callbacks()['slow'][0])
+        self.assertEqual([('slow', self.main), ('foo', self.main)] * 2,
+                called_order)
+
+    def test_never_demoted(self):
+        foo.set_demotion_policy(0.1)
+        foo.add_post_callback(callback('critical', 1.0), label='critical',
+                order_critical=True)
+        def short_circuit():
+            clock.now += 1.0
+        foo.add_pre_callback(short_circuit, label='short_circuit',
+                can_short_circuit=True)
+
+        foo()
+        self.assertEqual({}, foo.demoted_callbacks())
+
+    def test_remove_policy(self):
+        foo.set_demotion_policy(0.1)
+        foo.add_post_callback(callback('slow', 1.0), label='slow')
+        foo()
+        self.assertEqual(['slow'], foo.demoted_callbacks().keys())
+
+        foo.set_demotion_policy(None)
+        self.assertEqual({}, foo.demoted_callbacks())
+        del called_order[:]
+        foo()
+        self.assertEqual([('foo', self.main), ('slow', self.main)],
+                called_order)
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, foo.set_demotion_policy, 'x')
+        self.assertRaises(ValueError, foo.set_demotion_policy, 1, alpha=0)
+        self.assertRaises(ValueError, foo.set_demotion_policy, 1,
+                action='drop')
@@ -0,0 +1,141 @@
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.snapshot import snapshot, restore
+
+from fakes import FakeClock, FakeScheduler
+
+clock = FakeClock()
+
+reported = []
+def reporter(exception, count, *args, **kwargs):
+    reported.append((type(exception), count, args, kwargs))
+
+handled = []
+def handler(exception):
+    handled.append(exception)
+    return 'handled'
+
+@supports_callbacks
+def foo(kind, message='down'):
+    if kind == 'value':
+        raise ValueError(message)
+    elif kind == 'key':
+        raise KeyError(message)
+    elif kind == 'other_line':
+        raise ValueError(message)
+    return kind
+
+class TestExceptionAggregation(unittest.TestCase):
+    def setUp(self):
+        while reported:
+            reported.pop()
+        while handled:
+            handled.pop()
+        clock.now = 0.0
+        self.scheduler = FakeScheduler(clock)
+        foo.set_scheduler(self.scheduler, clock=clock)
+        foo.remove_callbacks()
+
+    def tearDown(self):
+        foo.set_scheduler(None)
+
+    def test_storm(self):
+        foo.add_exception_callback(reporter, aggregate_window=1)
+
+        for i in range(100):
+            self.assertRaises(ValueError, foo, 'value')
+        self.assertEqual([(ValueError, 1, (), {})], reported)
+
+        clock.now = 1.5
+        self.assertRaises(ValueError, foo, 'value')
+        self.assertEqual([(ValueError, 1, (), {}), (ValueError, 100, (), {})],
+                reported)
+
+    def test_window_closes(self):
+        foo.add_exception_callback(reporter, aggregate_window=1)
+
+        for i in range(100):
+            self.assertRaises(ValueError, foo, 'value')
+        self.assertRaises(KeyError, foo, 'key')
+        self.assertEqual([(ValueError, 1, (), {}), (KeyError, 1, (), {})],
+                reported)
+
+        # reported without another exception or a flush
+        self.scheduler.advance(1)
+        self.assertEqual([(ValueError, 1, (), {}), (KeyError, 1, (), {}),
+                (ValueError, 99, (), {})], reported)
+
+        # nothing left to report in the next window
+        self.scheduler.advance(1)
+        self.assertEqual(3, len(reported))
+        self.assertEqual([], [timer for timer in self.scheduler.timers
+                if not timer.cancelled])
+
+    def test_removed_before_window_closes(self):
+        foo.add_exception_callback(reporter, aggregate_window=1)
+        for i in range(3):
+            self.assertRaises(ValueError, foo, 'value')
+        foo.remove_callbacks()
+
+        self.scheduler.advance(1)
+        self.assertEqual([(ValueError, 1, (), {})], reported)
+
+    def test_groups(self):
+        foo.add_exception_callback(reporter, aggregate_window=1,
+                takes_target_args=True)
+
+        for kind in ['value', 'key', 'other_line', 'value', 'key']:
+            self.assertRaises(Exception, foo, kind)
+        self.assertRaises(ValueError, foo, 'value', message='different')
+
+        self.assertEqual([
+            (ValueError, 1, ('value',), {}),
+            (KeyError, 1, ('key',), {}),
+            (ValueError, 1, ('other_line',), {}),
+            (ValueError, 1, ('value',), {'message': 'different'}),
+            ], reported)
+
+    def test_flush(self):
+        foo.add_exception_callback(reporter, aggregate_window=10,
+                takes_target_args=True)
+        for i in range(3):
+            self.assertRaises(ValueError, foo, 'value', message='down')
+
+        clock.now = 1
+        foo.flush_aggregated_exceptions()
+        foo.flush_aggregated_exceptions()
+        self.assertEqual([
+            (ValueError, 1, ('value',), {'message': 'down'}),
+            (ValueError, 2, ('value',), {'message': 'down'}),
+            ], reported)
+
+        # the flush started a new window
+        self.assertRaises(ValueError, foo, 'value', message='down')
+        self.assertEqual(2, len(reported))
+
+    def test_handlers_run_per_call(self):
+        foo.add_exception_callback(handler, handles_exception=True,
+                priority=1)
+        foo.add_exception_callback(reporter, aggregate_window=1)
+
+        for i in range(5):
+            self.assertEqual('handled', foo('value'))
+        self.assertEqual(5, len(handled))
+        self.assertEqual([(ValueError, 1, (), {})], reported)
+
+    def test_cannot_aggregate_handlers(self):
+        self.assertRaises(ValueError, foo.add_exception_callback, handler,
+                handles_exception=True, aggregate_window=1)
+        self.assertRaises(ValueError, foo.add_exception_callback, reporter,
+                aggregate_window='boo')
+
+    def test_snapshot(self):
+        foo.add_exception_callback(reporter, aggregate_window=1)
+        self.assertRaises(ValueError, foo, 'value')
+
+        data = snapshot({'foo': foo})
+        restore(data, {'foo': foo})
+
+        self.assertRaises(ValueError, foo, 'value')
+        self.assertEqual(2, len(reported))
@@ -0,0 +1,89 @@
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.snapshot import snapshot, restore
+
+called_order = []
+def cb1():
+    called_order.append('cb1')
+def cb2():
+    called_order.append('cb2')
+
+@supports_callbacks
+def foo():
+    pass
+
+class TestFreeze(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        foo.thaw()
+        foo.remove_callbacks()
+
+    def tearDown(self):
+        foo.thaw()
+
+    def test_frozen_dispatch(self):
+        foo.add_callback(cb1)
+        foo.add_callback(cb2, priority=1)
+        foo.freeze()
+        self.assertTrue(foo.frozen)
+
+        foo()
+        self.assertEqual(['cb2', 'cb1'], called_order)
+
+    def test_mutation_raises(self):
+        label = foo.add_callback(cb1)
+        foo.freeze()
+
+        self.assertRaises(RuntimeError, foo.add_callback, cb2)
+        self.assertRaises(RuntimeError, foo.add_pre_callback, cb2)
+        self.assertRaises(RuntimeError, foo.add_exception_callback, cb2)
+        self.assertRaises(RuntimeError, foo.remove_callback, label)
+        self.assertRaises(RuntimeError, foo.remove_callbacks, [label])
+        self.assertRaises(RuntimeError, foo.remove_callbacks)
+        self.assertRaises(RuntimeError, restore, snapshot({'foo': foo}),
+                {'foo': foo})
+
+        foo()
+        self.assertEqual(['cb1'], called_order)
+
+    def test_stateful_callbacks_rejected(self):
+        for options in [{'times': 1}, {'throttle': 1}, {'debounce': 1}]:
+            label = foo.add_callback(cb1, **options)
+            self.assertRaises(RuntimeError, foo.freeze)
+            self.assertFalse(foo.frozen)
+            foo.remove_callback(label)
+        label = foo.add_exception_callback(cb1, aggregate_window=1)
+        self.assertRaises(RuntimeError, foo.freeze)
+        foo.remove_callback(label)
+
+        foo.set_demotion_policy(1)
+        try:
+            self.assertRaises(RuntimeError, foo.freeze)
+        finally:
+            foo.set_demotion_policy(None)
+        foo.freeze()
+        self.assertRaises(RuntimeError, foo.set_demotion_policy, 1)
+        self.assertRaises(RuntimeError, foo.set_demotion_policy, None)
+
+    def test_calls_do_not_write(self):
+        foo.add_pre_callback(cb1)
+        foo.add_callback(cb2)
+        foo.freeze()
+        before = [dict(info) for _, _, info in foo._plan('pre') +
+                foo._plan('post')]
+
+        foo()
+        self.assertEqual(before, [info for _, _, info in foo._plan('pre') +
+                foo._plan('post')])
+
+    def test_thaw(self):
+        foo.add_callback(cb1)
+        foo.freeze()
+        foo.thaw()
+        self.assertFalse(foo.frozen)
+
+        foo.add_callback(cb2, priority=1)
+        foo()
+        self.assertEqual(['cb2', 'cb1'], called_order)
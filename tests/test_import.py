@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import unittest
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that are slow to import and not needed to call decorated functions
+DEFERRED_MODULES = ['uuid', 'inspect', 'threading', 'collections', 'ctypes']
+
+CHECK_MODULES = '''
+import sys
+from callbacks import supports_callbacks
+
+@supports_callbacks
+def target(a, b=None):
+    return a
+
+def callback(*args, **kwargs):
+    pass
+
+target.add_pre_callback(callback, label='pre', takes_target_args=True)
+target.add_post_callback(callback, label='post', takes_target_result=True)
+target(1)
+print ' '.join(name for name in %r if sys.modules.get(name) is not None)
+''' % DEFERRED_MODULES
+
+class TestImport(unittest.TestCase):
+    def test_fast_path_imports(self):
+        env = dict(os.environ, PYTHONPATH=PACKAGE_ROOT)
+        output = subprocess.check_output([sys.executable, '-S', '-c',
+                CHECK_MODULES], env=env)
+        self.assertEqual('', output.strip())
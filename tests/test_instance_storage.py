@@ -0,0 +1,93 @@
+import gc
+import unittest
+
+from callbacks import supports_callbacks, CALLBACKS_SLOT
+
+called_with = []
+def callback(*args, **kwargs):
+    called_with.append((args, kwargs))
+
+class Slotted(object):
+    __slots__ = ('value', CALLBACKS_SLOT)
+
+    def __init__(self, value):
+        self.value = value
+
+    @supports_callbacks
+    def method(self):
+        return self.value
+
+    @supports_callbacks
+    def other_method(self):
+        return -self.value
+
+class SlottedWithoutStorage(object):
+    __slots__ = ('value',)
+
+    @supports_callbacks
+    def method(self):
+        pass
+
+class Unhashable(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    __hash__ = None
+
+    @supports_callbacks
+    def method(self):
+        return self.value
+
+class Plain(object):
+    @supports_callbacks
+    def method(self):
+        pass
+
+class TestInstanceStorage(unittest.TestCase):
+    def setUp(self):
+        while called_with:
+            called_with.pop()
+
+    def test_slotted(self):
+        s1 = Slotted(1)
+        s2 = Slotted(2)
+        s1.method.add_callback(callback, takes_target_result=True)
+        s1.other_method.add_callback(callback, takes_target_result=True)
+
+        self.assertEqual(1, s1.method())
+        self.assertEqual(2, s2.method())
+        self.assertEqual(-1, s1.other_method())
+
+        self.assertEqual([((1,), {}), ((-1,), {})], called_with)
+        self.assertEqual(2, len(getattr(s1, CALLBACKS_SLOT)))
+        self.assertEqual(0, len(Slotted.method._instances))
+
+    def test_slotted_without_storage(self):
+        s = SlottedWithoutStorage()
+        self.assertRaises(TypeError, getattr, s, 'method')
+
+    def test_unhashable(self):
+        u1 = Unhashable(1)
+        u2 = Unhashable(1)
+        u1.method.add_callback(callback, takes_target_result=True)
+
+        self.assertEqual(1, u1.method())
+        self.assertEqual(1, u2.method())
+        self.assertEqual([((1,), {})], called_with)
+
+        self.assertEqual(2, len(Unhashable.method._instances_by_id))
+        del u1, u2
+        gc.collect()
+        self.assertEqual(0, len(Unhashable.method._instances_by_id))
+
+    def test_registry_does_not_keep_instance_alive(self):
+        p = Plain()
+        p.method.add_callback(callback)
+        self.assertEqual(1, len(Plain.method._instances))
+
+        del p
+        gc.collect()
+        self.assertEqual(0, len(Plain.method._instances))
@@ -1,4 +1,6 @@
 from collections import defaultdict
+import copy
+import pickle
 import unittest
 from mock import Mock
 
@@ -95,3 +97,86 @@ class TestOnMethod(unittest.TestCase):
         expected_called_with = [((1,),{}), ((2,),{})]
         self.assertEquals(expected_called_with, e.method_called_with)
         self.assertEquals([(tuple(),{}), ((m, 3),{})], callback_called_with)
+
+
+class RegistryExampleClass(object):
+    def __init__(self):
+        self.method_called_with = []
+
+    @supports_callbacks
+    def example_method(self, *args, **kwargs):
+        self.method_called_with.append((args, kwargs))
+
+
+class TestInstanceRegistries(unittest.TestCase):
+    def setUp(self):
+        while callback_called_with:
+            callback_called_with.pop()
+        RegistryExampleClass.example_method.remove_callbacks()
+
+    def test_copy(self):
+        e = RegistryExampleClass()
+        e.example_method.add_callback(example_callback)
+        c = copy.copy(e)
+        c.method_called_with = []
+
+        c.example_method(1)
+        self.assertEquals([((1,), {})], c.method_called_with)
+        self.assertEquals([], e.method_called_with)
+        self.assertEquals([], callback_called_with)
+
+        e.example_method(2)
+        self.assertEquals([((2,), {})], e.method_called_with)
+        self.assertEquals([(tuple(), {})], callback_called_with)
+
+        d = copy.deepcopy(e)
+        d.example_method(3)
+        self.assertEquals(1, len(callback_called_with))
+
+    def test_pickle(self):
+        e = RegistryExampleClass()
+        e.example_method.add_callback(example_callback)
+        e.example_method(1)
+
+        p = pickle.loads(pickle.dumps(e, pickle.HIGHEST_PROTOCOL))
+        self.assertEquals([((1,), {})], p.method_called_with)
+        p.example_method(2)
+        self.assertEquals([((1,), {}), ((2,), {})], p.method_called_with)
+        self.assertEquals([(tuple(), {})], callback_called_with)
+        self.assertEquals(pickle.loads(pickle.dumps(e)).method_called_with,
+                e.method_called_with)
+
+    def test_callbacks_are_per_instance(self):
+        e1 = RegistryExampleClass()
+        e2 = RegistryExampleClass()
+        e1.example_method.add_callback(example_callback)
+
+        e1.example_method(1, key='value')
+        e2.example_method(2)
+
+        self.assertEquals([((1,), {'key':'value'})], e1.method_called_with)
+        self.assertEquals([((2,), {})], e2.method_called_with)
+        self.assertEquals([(tuple(), {})], callback_called_with)
+
+    def test_class_callbacks_still_run(self):
+        e = RegistryExampleClass()
+        e.example_method(1)
+        RegistryExampleClass.example_method.add_callback(example_callback)
+
+        e.example_method(2)
+
+        self.assertEquals([(tuple(), {})], callback_called_with)
+
+    def test_describe_callbacks(self):
+        e = RegistryExampleClass()
+        RegistryExampleClass.example_method.add_callback(example_callback,
+                label='class')
+        e.example_method.add_pre_callback(example_callback, label='instance')
+
+        self.assertEquals([('instance', 'pre', 'self'),
+                ('class', 'post', 'parent')],
+                [(r['label'], r['type'], r['origin'])
+                for r in e.example_method.describe_callbacks()])
+        self.assertEquals(['instance'], [r['label'] for r in
+                e.example_method.describe_callbacks(include_parent=False)])
+        RegistryExampleClass.example_method.remove_callbacks()
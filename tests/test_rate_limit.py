@@ -0,0 +1,140 @@
+import unittest
+
+from callbacks import supports_callbacks
+
+from fakes import FakeClock, FakeScheduler
+
+clock = FakeClock()
+
+called_with = []
+
+def callback(*args, **kwargs):
+    called_with.append((clock.now, args, kwargs))
+
+@supports_callbacks
+def foo(bar):
+    return bar * 2
+
+class Example(object):
+    @supports_callbacks
+    def method(self, bar):
+        return bar + 1
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        while called_with:
+            called_with.pop()
+        clock.now = 0.0
+        self.scheduler = FakeScheduler(clock)
+        foo.remove_callbacks()
+        foo.set_scheduler(self.scheduler, clock=clock)
+        Example.method.set_scheduler(self.scheduler, clock=clock)
+
+    def test_throttle(self):
+        foo.add_post_callback(callback, takes_target_args=True,
+                takes_target_result=True, throttle=1.0)
+
+        foo(1)
+        self.assertEqual([(0.0, (2, 1), {})], called_with)
+        self.scheduler.advance(0.2)
+        foo(2)
+        self.scheduler.advance(0.2)
+        foo(3)
+        self.assertEqual(1, len(called_with))
+        self.assertEqual(1, len(self.scheduler.timers))
+
+        self.scheduler.advance(0.6)
+        self.assertEqual([(0.0, (2, 1), {}), (1.0, (6, 3), {})], called_with)
+
+        # still within a second of the trailing run
+        self.scheduler.advance(0.5)
+        foo(4)
+        self.assertEqual(2, len(called_with))
+        self.scheduler.advance(0.5)
+        self.assertEqual((2.0, (8, 4), {}), called_with[-1])
+
+        self.scheduler.advance(5)
+        foo(5)
+        self.assertEqual((7.0, (10, 5), {}), called_with[-1])
+        self.assertEqual(4, len(called_with))
+
+    def test_debounce(self):
+        foo.add_pre_callback(callback, takes_target_args=True, debounce=1.0)
+
+        foo(1)
+        self.scheduler.advance(0.5)
+        foo(2)
+        self.scheduler.advance(0.9)
+        foo(3)
+        self.assertEqual([], called_with)
+
+        self.scheduler.advance(0.9)
+        self.assertEqual([], called_with)
+        self.scheduler.advance(0.1)
+        self.assertEqual([(2.4, (3,), {})], called_with)
+
+        self.scheduler.advance(5)
+        self.assertEqual(1, len(called_with))
+
+    def test_times(self):
+        foo.add_post_callback(callback, throttle=1.0, times=2)
+
+        foo(1)
+        foo(2)
+        self.scheduler.advance(1)
+        foo(3)
+        self.scheduler.advance(1)
+        self.assertEqual(2, len(called_with))
+        self.assertEqual([], foo.callbacks.keys())
+
+    def test_removed_while_pending(self):
+        label = foo.add_post_callback(callback, debounce=1.0)
+
+        foo(1)
+        foo.remove_callback(label)
+        self.assertTrue(self.scheduler.timers[0].cancelled)
+        self.scheduler.advance(2)
+        self.assertEqual([], called_with)
+
+    def test_other_callbacks_unaffected(self):
+        foo.add_post_callback(callback, label='debounced', debounce=1.0)
+        foo.add_post_callback(callback, label='plain')
+
+        foo(1)
+        foo(2)
+        self.assertEqual(2, len(called_with))
+
+    def test_instance_uses_method_scheduler(self):
+        e = Example()
+        e.method.add_post_callback(callback, takes_target_result=True,
+                debounce=1.0)
+
+        e.method(1)
+        e.method(2)
+        self.assertEqual(1, len(self.scheduler.timers))
+        self.scheduler.advance(1)
+        self.assertEqual([(1.0, (3,), {})], called_with)
+
+    def test_bad_options(self):
+        self.assertRaises(ValueError, foo.add_post_callback, callback,
+                throttle=1, debounce=1)
+        self.assertRaises(ValueError, foo.add_post_callback, callback,
+                throttle=0)
+        self.assertRaises(ValueError, foo.add_pre_callback, callback,
+                debounce='x')
+        self.assertRaises(ValueError, foo.add_pre_callback, callback,
+                debounce=1, can_short_circuit=True)
+        self.assertEqual({}, foo.callbacks)
+
+class TestDefaultScheduler(unittest.TestCase):
+    def test_timer_thread(self):
+        import threading
+        done = threading.Event()
+        foo.remove_callbacks()
+        foo.set_scheduler(None)
+        foo.add_post_callback(lambda result: done.set(),
+                takes_target_result=True, debounce=0.01)
+
+        foo(1)
+        self.assertTrue(done.wait(5))
+        foo.remove_callbacks()
@@ -0,0 +1,125 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.recording import CallRecorder, read_records, replay
+
+@supports_callbacks
+def foo(bar, baz=None):
+    if bar < 0:
+        raise ValueError('negative')
+    return bar * 2
+
+class Foo(object):
+    @supports_callbacks
+    def method(self, bar):
+        return bar + 1
+
+    def __reduce__(self):
+        raise TypeError('Foo instances cannot be pickled')
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        foo.remove_callbacks()
+        foo.set_recorder(None)
+        Foo.method.set_recorder(None)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'calls')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record(self):
+        with CallRecorder(self.path) as recorder:
+            foo.set_recorder(recorder)
+            foo(1)
+            foo(2, baz='x')
+            self.assertRaises(ValueError, foo, -1)
+            foo.set_recorder(None)
+            foo(3)
+
+        records = list(read_records(self.path))
+        self.assertEquals(3, len(records))
+        self.assertEquals([((1,), {}, 'result', 2),
+                ((2,), {'baz': 'x'}, 'result', 4)],
+                [record[:4] for record in records[:2]])
+        args, kwargs, outcome, value, started, duration = records[2]
+        self.assertEquals(((-1,), {}, 'exception'), (args, kwargs, outcome))
+        self.assertTrue(isinstance(value, ValueError))
+        self.assertTrue(isinstance(started, float))
+        self.assertTrue(duration >= 0)
+
+    def test_method(self):
+        with CallRecorder(self.path) as recorder:
+            Foo.method.set_recorder(recorder)
+            Foo().method(5)
+            self.assertEquals(0, recorder.dropped)
+
+        self.assertEquals([((5,), {}, 'result', 6)],
+                [record[:4] for record in read_records(self.path)])
+
+    def test_unserializable(self):
+        with CallRecorder(self.path) as recorder:
+            foo.set_recorder(recorder)
+            foo(1, baz=lambda: None)
+            foo(1)
+            self.assertEquals(1, recorder.dropped)
+            self.assertEquals(1, recorder.recorded)
+
+    def test_failing_recorder(self):
+        handled = []
+        def handler(exception):
+            handled.append(exception)
+            return 'handled'
+        foo.add_exception_callback(handler, handles_exception=True)
+        messages = []
+        log_handler = logging.Handler()
+        log_handler.emit = lambda record: messages.append(record.getMessage())
+        logger = logging.getLogger('callbacks')
+        logger.addHandler(log_handler)
+        try:
+            # closed while still attached
+            recorder = CallRecorder(self.path)
+            foo.set_recorder(recorder)
+            recorder.close()
+
+            self.assertEqual(2, foo(1))
+            self.assertEqual('handled', foo(-1))
+        finally:
+            logger.removeHandler(log_handler)
+        self.assertEqual(['negative'], [str(e) for e in handled])
+        self.assertEqual(2, len(messages))
+        self.assertTrue(messages[0].startswith('Recorder'))
+
+    def test_truncated(self):
+        with CallRecorder(self.path) as recorder:
+            foo.set_recorder(recorder)
+            foo(1)
+            foo(2)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        self.assertEquals(1, len(list(read_records(self.path))))
+
+    def test_replay(self):
+        with CallRecorder(self.path) as recorder:
+            foo.set_recorder(recorder)
+            foo(1)
+            foo(2, baz='x')
+            self.assertRaises(ValueError, foo, -1)
+        foo.set_recorder(None)
+
+        calls = []
+        foo.add_post_callback(lambda *args, **kwargs: calls.append(
+                (args, kwargs)), takes_target_args=True)
+        stats = replay(self.path, foo)
+        self.assertEquals(3, stats['calls'])
+        self.assertEquals(1, stats['errors'])
+        self.assertEquals([((1,), {}), ((2,), {'baz': 'x'})], calls)
+
+    def test_not_a_recording(self):
+        with open(self.path, 'wb') as f:
+            f.write('garbage')
+        self.assertRaises(ValueError, list, read_records(self.path))
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.ringbuffer import RingBufferSink, RingBufferReader
+
+@supports_callbacks
+def foo(bar, baz=None):
+    return bar * 2
+
+def read_in_child(path, expected, queue):
+    reader = RingBufferReader(path)
+    records = []
+    deadline = time.time() + 10
+    while len(records) < expected and time.time() < deadline:
+        records.extend(reader.read())
+        time.sleep(0.001)
+    queue.put(records)
+
+class TestRingBuffer(unittest.TestCase):
+    def setUp(self):
+        foo.remove_callbacks()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ring')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_attach(self):
+        with RingBufferSink(self.path) as sink:
+            label = sink.attach(foo)
+            self.assertEqual('foo', label)
+            foo(1)
+            foo(2, baz='x')
+
+            with RingBufferReader(self.path) as reader:
+                records = reader.read()
+                self.assertEqual([('foo', (1,), {}, 2),
+                        ('foo', (2,), {'baz': 'x'}, 4)],
+                        [record[:4] for record in records])
+                self.assertTrue(all(isinstance(record[4], float)
+                        for record in records))
+                self.assertEqual([], reader.read())
+
+                foo(3)
+                self.assertEqual(1, len(reader.read()))
+
+    def test_overwrite(self):
+        with RingBufferSink(self.path, capacity=4) as sink:
+            reader = RingBufferReader(self.path)
+            for i in range(10):
+                self.assertTrue(sink.write(i))
+
+            self.assertEqual([6, 7, 8, 9], reader.read())
+            self.assertEqual(6, reader.lost)
+            reader.close()
+
+    def test_drop(self):
+        with RingBufferSink(self.path, capacity=4, overwrite=False) as sink:
+            reader = RingBufferReader(self.path)
+            results = [sink.write(i) for i in range(6)]
+            self.assertEqual([True] * 4 + [False] * 2, results)
+
+            self.assertEqual([0, 1], reader.read(max_records=2))
+            self.assertTrue(sink.write(6))
+            self.assertEqual([2, 3, 6], reader.read())
+            self.assertEqual(2, reader.dropped)
+            self.assertEqual(0, reader.lost)
+            reader.close()
+
+    def test_record_too_large(self):
+        with RingBufferSink(self.path, slot_size=64) as sink:
+            self.assertFalse(sink.write('x' * 100))
+            self.assertEqual(1, sink.dropped)
+
+    def test_concurrent_writers(self):
+        num_threads, num_calls = 8, 500
+        interval = sys.getcheckinterval()
+        # switch threads as often as possible to provoke the race
+        sys.setcheckinterval(1)
+        try:
+            with RingBufferSink(self.path,
+                    capacity=num_threads * num_calls) as sink:
+                sink.attach(foo)
+                threads = [threading.Thread(target=lambda: [foo(i)
+                        for i in range(num_calls)])
+                        for j in range(num_threads)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                with RingBufferReader(self.path) as reader:
+                    records = reader.read()
+                    self.assertEqual(0, reader.lost)
+                self.assertEqual(0, sink.dropped)
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual(sorted(range(num_calls) * num_threads),
+                sorted(record[1][0] for record in records))
+
+    def test_unserializable(self):
+        with RingBufferSink(self.path) as sink:
+            sink.attach(foo)
+            self.assertEqual(2, foo(1, baz=threading.Lock()))
+            self.assertFalse(sink.write(lambda: None))
+            foo(2)
+            self.assertEqual(2, sink.dropped)
+
+            with RingBufferReader(self.path) as reader:
+                self.assertEqual([('foo', (2,), {}, 4)],
+                        [record[:4] for record in reader.read()])
+                self.assertEqual(2, reader.dropped)
+
+    def test_not_a_ring_buffer(self):
+        with open(self.path, 'wb') as f:
+            f.write('\0' * 128)
+        self.assertRaises(ValueError, RingBufferReader, self.path)
+
+    def test_two_processes(self):
+        num_records = 200
+        with RingBufferSink(self.path, capacity=num_records) as sink:
+            sink.attach(foo, label='foo_calls')
+            queue = multiprocessing.Queue()
+            reader = multiprocessing.Process(target=read_in_child,
+                    args=(self.path, num_records, queue))
+            reader.start()
+            for i in range(num_records):
+                foo(i)
+            records = queue.get(timeout=10)
+            reader.join()
+
+        self.assertEqual([('foo_calls', (i,), {}, i * 2)
+                for i in range(num_records)],
+                [record[:4] for record in records])
@@ -0,0 +1,104 @@
+import unittest
+
+from callbacks import supports_callbacks, ShortCircuit
+
+called_order = []
+cache = {}
+
+def cached(bar):
+    called_order.append('cached')
+    if bar in cache:
+        return ShortCircuit(cache[bar])
+
+def store(result, bar):
+    called_order.append('store')
+    cache[bar] = result
+
+def observer():
+    called_order.append('observer')
+    return ShortCircuit('ignored')
+
+def low():
+    called_order.append('low')
+
+@supports_callbacks
+def foo(bar):
+    called_order.append('foo')
+    return bar * 2
+
+class Foo(object):
+    @supports_callbacks
+    def method(self, bar):
+        called_order.append('method')
+        return bar + 1
+
+class TestShortCircuit(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        cache.clear()
+        foo.remove_callbacks()
+        Foo.method.remove_callbacks()
+
+    def test_cache(self):
+        foo.add_pre_callback(cached, takes_target_args=True,
+                can_short_circuit=True)
+        foo.add_post_callback(store, takes_target_args=True,
+                takes_target_result=True)
+
+        self.assertEqual(4, foo(2))
+        self.assertEqual(4, foo(2))
+        self.assertEqual(['cached', 'foo', 'store', 'cached', 'store'],
+                called_order)
+
+    def test_skips_lower_priority(self):
+        cache[1] = 'hit'
+        foo.add_pre_callback(cached, priority=1, takes_target_args=True,
+                can_short_circuit=True)
+        foo.add_pre_callback(low)
+
+        self.assertEqual('hit', foo(1))
+        self.assertEqual(['cached'], called_order)
+
+        self.assertEqual(4, foo(2))
+        self.assertEqual(['cached', 'cached', 'low', 'foo'], called_order)
+
+    def test_not_enabled(self):
+        foo.add_pre_callback(observer)
+
+        self.assertEqual(6, foo(3))
+        self.assertEqual(['observer', 'foo'], called_order)
+
+    def test_other_values_ignored(self):
+        foo.add_pre_callback(low, can_short_circuit=True)
+
+        self.assertEqual(6, foo(3))
+        self.assertEqual(['low', 'foo'], called_order)
+
+    def test_none_value(self):
+        foo.add_pre_callback(lambda: ShortCircuit(), can_short_circuit=True)
+
+        self.assertEqual(None, foo(3))
+        self.assertEqual([], called_order)
+
+    def test_method(self):
+        cache[(3,)] = 'hit'
+        Foo.method.add_pre_callback(lambda instance, bar:
+                cache.get((bar,)) and ShortCircuit(cache[(bar,)]),
+                takes_target_args=True, can_short_circuit=True)
+        f = Foo()
+        f.method.add_pre_callback(low)
+
+        self.assertEqual('hit', f.method(3))
+        self.assertEqual(['low'], called_order)
+        self.assertEqual(5, f.method(4))
+        self.assertEqual(['low', 'low', 'method'], called_order)
+
+    def test_instance_skips_class(self):
+        Foo.method.add_pre_callback(low)
+        f = Foo()
+        f.method.add_pre_callback(lambda: ShortCircuit('hit'),
+                can_short_circuit=True)
+
+        self.assertEqual('hit', f.method(3))
+        self.assertEqual([], called_order)
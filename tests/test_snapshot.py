@@ -0,0 +1,97 @@
+import json
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.snapshot import snapshot, restore
+
+called_order = []
+def cb1(*args, **kwargs):
+    called_order.append(('cb1', args, kwargs))
+def cb2(*args, **kwargs):
+    called_order.append(('cb2', args, kwargs))
+def handler(exception):
+    called_order.append(('handler',))
+    return 'handled'
+def first_arg(bar):
+    return bar
+
+@supports_callbacks
+def foo(bar):
+    if bar is None:
+        raise ValueError
+    return bar
+
+@supports_callbacks
+def baz():
+    pass
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        foo.remove_callbacks()
+        baz.remove_callbacks()
+
+    def register(self):
+        foo.add_pre_callback(cb1, takes_target_args=True)
+        foo.add_post_callback(cb2, label='post', priority=2,
+                takes_target_result=True)
+        foo.add_post_callback(cb1, label='bound', takes_bound_args=True,
+                defer_key=first_arg)
+        foo.add_exception_callback(handler, handles_exception=True)
+        baz.add_callback(cb1, label=7)
+
+    def test_round_trip(self):
+        self.register()
+        expected_info = foo._callbacks_info
+        expected_baz_info = baz._callbacks_info
+        data = json.loads(json.dumps(snapshot({'foo': foo, 'baz': baz})))
+
+        foo.remove_callbacks()
+        baz.remove_callbacks()
+        restore(data, {'foo': foo, 'baz': baz})
+
+        self.assertEqual(expected_info, foo._callbacks_info)
+        self.assertEqual(expected_baz_info, baz._callbacks_info)
+        self.assertTrue(foo.callbacks['bound']['defer_key'] is first_arg)
+        self.assertEqual(1, foo._num_bound_args_callbacks)
+
+        foo(1)
+        self.assertEqual([('cb1', (1,), {}), ('cb2', (1,), {}),
+                ('cb1', ({'bar': 1},), {})], called_order)
+        self.assertEqual('handled', foo(None))
+
+        # restored registrations can still be changed as usual
+        foo.remove_callback(cb1)
+        foo.remove_callback('post')
+        baz()
+        self.assertEqual(('cb1', (), {}), called_order[-1])
+
+    def test_restore_replaces_registrations(self):
+        self.register()
+        data = snapshot({'foo': foo})
+        foo.add_callback(cb2, label='extra')
+
+        restore(data, {'foo': foo})
+
+        self.assertFalse('extra' in foo.callbacks)
+
+    def test_unimportable_callback(self):
+        foo.add_callback(lambda: None, label='lambda')
+        self.assertRaises(ValueError, snapshot, {'foo': foo})
+
+    def test_unserializable_label(self):
+        foo.add_callback(cb1, label=('a', 'tuple'))
+        self.assertRaises(ValueError, snapshot, {'foo': foo})
+
+    def test_missing_target(self):
+        self.register()
+        data = snapshot({'foo': foo, 'baz': baz})
+        foo.remove_callbacks()
+
+        self.assertRaises(RuntimeError, restore, data, {'foo': foo})
+        self.assertEqual(0, len(foo.callbacks))
+
+    def test_bad_version(self):
+        self.assertRaises(ValueError, restore, {'version': 0, 'targets': {}},
+                {})
@@ -0,0 +1,83 @@
+import unittest
+
+from callbacks import supports_callbacks
+
+from fakes import clock, patch_clock
+
+called_order = []
+
+def slow_target():
+    clock.now += 0.5
+
+def slow_callback(name):
+    def callback():
+        called_order.append(name)
+        clock.now += 0.5
+    return callback
+
+@supports_callbacks
+def foo():
+    slow_target()
+
+@patch_clock
+class TestTimeBudget(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        clock.now = 0.0
+        foo.remove_callbacks()
+        foo.set_time_budget(None)
+        foo.shed_counts.clear()
+
+    def test_no_budget(self):
+        foo.add_pre_callback(slow_callback('pre'), priority=-1)
+        foo.add_post_callback(slow_callback('post'), priority=-1)
+
+        foo()
+        self.assertEqual(called_order, ['pre', 'post'])
+        self.assertEqual(dict(foo.shed_counts), {})
+
+    def test_sheds_low_priority(self):
+        foo.add_post_callback(slow_callback('high'), label='high', priority=1)
+        foo.add_post_callback(slow_callback('low1'), label='low1', priority=-1)
+        foo.add_post_callback(slow_callback('low2'), label='low2', priority=-2)
+        foo.set_time_budget(0.75, shed_below=0)
+
+        foo()
+        # target takes 0.5, 'high' takes 0.5 -> budget spent
+        self.assertEqual(called_order, ['high'])
+        self.assertEqual(dict(foo.shed_counts), {'low1': 1, 'low2': 1})
+
+        foo()
+        self.assertEqual(called_order, ['high', 'high'])
+        self.assertEqual(dict(foo.shed_counts), {'low1': 2, 'low2': 2})
+
+    def test_high_priority_always_runs(self):
+        foo.add_pre_callback(slow_callback('pre'), priority=5)
+        foo.add_post_callback(slow_callback('post'), priority=0)
+        foo.set_time_budget(0.1, shed_below=0)
+
+        foo()
+        self.assertEqual(called_order, ['pre', 'post'])
+        self.assertEqual(dict(foo.shed_counts), {})
+
+    def test_within_budget(self):
+        foo.add_pre_callback(slow_callback('pre'), priority=-1)
+        foo.add_post_callback(slow_callback('post'), priority=-1)
+        foo.set_time_budget(2, shed_below=0)
+
+        foo()
+        self.assertEqual(called_order, ['pre', 'post'])
+
+    def test_pre_callbacks_shed(self):
+        foo.add_pre_callback(slow_callback('pre1'), label='pre1', priority=-1)
+        foo.add_pre_callback(slow_callback('pre2'), label='pre2', priority=-1)
+        foo.set_time_budget(0.25, shed_below=0)
+
+        foo()
+        self.assertEqual(called_order, ['pre1'])
+        self.assertEqual(dict(foo.shed_counts), {'pre2': 1})
+
+    def test_bad_budget(self):
+        self.assertRaises(ValueError, foo.set_time_budget, 'boo')
+        self.assertRaises(ValueError, foo.set_time_budget, 1, shed_below='boo')
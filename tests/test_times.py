@@ -0,0 +1,145 @@
+import sys
+import threading
+import unittest
+
+import callbacks
+from callbacks import supports_callbacks
+
+called_order = []
+def cb1(*args, **kwargs):
+    called_order.append('cb1')
+def cb2(*args, **kwargs):
+    called_order.append('cb2')
+def cb3(*args, **kwargs):
+    called_order.append('cb3')
+def handler(exception):
+    called_order.append('handler')
+    return 'handled'
+
+@supports_callbacks
+def foo(fail=False):
+    if fail:
+        raise ValueError
+    return 'foo'
+
+class TestTimes(unittest.TestCase):
+    def setUp(self):
+        while called_order:
+            called_order.pop()
+        foo.remove_callbacks()
+
+    def test_one_shot(self):
+        foo.add_pre_callback(cb1, times=1)
+        foo.add_post_callback(cb2, times=1)
+        foo.add_callback(cb3)
+
+        foo()
+        foo()
+        self.assertEqual(['cb1', 'cb2', 'cb3', 'cb3'], called_order)
+        self.assertEqual([cb3], foo.callbacks.keys())
+
+    def test_n_shot(self):
+        foo.add_callback(cb1, times=3)
+
+        for i in range(5):
+            foo()
+        self.assertEqual(['cb1'] * 3, called_order)
+        self.assertEqual(0, len(foo.callbacks))
+
+    def test_exception_callbacks(self):
+        foo.add_exception_callback(handler, handles_exception=True, times=1)
+
+        self.assertEqual('handled', foo(fail=True))
+        self.assertRaises(ValueError, foo, fail=True)
+
+    def test_label_reusable_after_expiry(self):
+        foo.add_callback(cb1, label='waiter', times=1)
+        foo()
+        foo.add_callback(cb2, label='waiter', times=1)
+        foo()
+        foo()
+
+        self.assertEqual(['cb1', 'cb2'], called_order)
+        self.assertEqual([], foo._registrations())
+
+    def test_order_kept_after_expiry(self):
+        foo.add_callback(cb1)
+        foo.add_callback(cb2, times=1)
+        foo.add_callback(cb3)
+        foo()
+        foo.add_callback(cb2)
+
+        self.assertEqual([cb1, cb3, cb2], [label for _, label, _ in
+                foo._plan('post')])
+
+    def test_removed_during_dispatch(self):
+        def remove_cb2():
+            called_order.append('remove_cb2')
+            foo.remove_callback(cb2)
+        foo.add_callback(remove_cb2)
+        foo.add_callback(cb2)
+        foo.add_callback(cb3)
+
+        foo()
+        self.assertEqual(['remove_cb2', 'cb3'], called_order)
+
+    def test_deferred_counts_runs(self):
+        foo.add_callback(cb1, times=1)
+
+        with callbacks.deferred():
+            foo()
+            foo()
+        foo()
+
+        self.assertEqual(['cb1'], called_order)
+
+    def test_shed_callbacks_do_not_count(self):
+        foo.add_callback(cb1, times=1, priority=-1)
+        foo.set_time_budget(-1)
+        try:
+            foo()
+        finally:
+            foo.set_time_budget(None)
+        foo()
+
+        self.assertEqual(['cb1'], called_order)
+
+    def test_expired_callbacks_are_not_shed(self):
+        foo.add_pre_callback(cb1, label='once_pre', times=1, priority=-1)
+        foo.add_post_callback(cb2, label='once_post', times=1, priority=-1)
+        foo()
+        foo.shed_counts.clear()
+        foo.set_time_budget(-1)
+        try:
+            foo()
+            foo()
+        finally:
+            foo.set_time_budget(None)
+
+        self.assertEqual(['cb1', 'cb2'], called_order)
+        self.assertEqual({}, foo.shed_counts)
+
+    def test_concurrent_calls(self):
+        interval = sys.getcheckinterval()
+        # switch threads as often as possible to provoke the race
+        sys.setcheckinterval(1)
+        try:
+            for trial in range(100):
+                foo.add_callback(cb1, label='waiter', times=1)
+                threads = [threading.Thread(target=lambda: [foo()
+                        for i in range(50)]) for j in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(['cb1'], called_order)
+                self.assertEqual({}, foo.callbacks)
+                self.assertEqual('foo', foo())
+                del called_order[:]
+        finally:
+            sys.setcheckinterval(interval)
+
+    def test_bad_times(self):
+        self.assertRaises(ValueError, foo.add_callback, cb1, times=0)
+        self.assertRaises(ValueError, foo.add_callback, cb1, times=1.5)
+        self.assertEqual(0, len(foo.callbacks))
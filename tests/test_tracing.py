@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from callbacks import supports_callbacks
+from callbacks.tracing import Tracer
+
+def callback(*args, **kwargs):
+    pass
+
+def handler(exception):
+    return 'handled'
+
+@supports_callbacks
+def foo(bar):
+    if bar is None:
+        raise ValueError
+    return bar
+
+class Example(object):
+    @supports_callbacks
+    def method(self):
+        pass
+
+def phases(tracer):
+    return [event[:3] for event in tracer.events()]
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        foo.remove_callbacks()
+        foo.set_tracer(None)
+        self.tracer = Tracer(capacity=16)
+
+    def test_records_target_and_callbacks(self):
+        foo.add_pre_callback(callback, label='a', priority=1)
+        foo.add_post_callback(callback, label='b')
+        foo.set_tracer(self.tracer)
+
+        foo(1)
+
+        self.assertEqual(phases(self.tracer), [
+            ('B', 'a', 'pre'), ('E', 'a', 'pre'),
+            ('B', 'foo', 'target'), ('E', 'foo', 'target'),
+            ('B', 'b', 'post'), ('E', 'b', 'post'),
+            ])
+        self.assertEqual(self.tracer.events()[0][3], 1.0)
+        timestamps = [event[5] for event in self.tracer.events()]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_exception_callbacks(self):
+        foo.add_exception_callback(handler, label='h', handles_exception=True)
+        foo.set_tracer(self.tracer)
+
+        self.assertEqual('handled', foo(None))
+        self.assertEqual(phases(self.tracer), [
+            ('B', 'foo', 'target'), ('E', 'foo', 'target'),
+            ('B', 'h', 'exception'), ('E', 'h', 'exception'),
+            ])
+
+    def test_not_tracing(self):
+        foo.add_post_callback(callback)
+        foo.set_tracer(self.tracer)
+        foo.set_tracer(None)
+
+        foo(1)
+        self.assertEqual(self.tracer.events(), [])
+
+    def test_ring_buffer_overwrites_oldest(self):
+        tracer = Tracer(capacity=3)
+        foo.set_tracer(tracer)
+
+        foo(1)
+        foo(2)
+
+        self.assertEqual(phases(tracer), [
+            ('E', 'foo', 'target'), ('B', 'foo', 'target'),
+            ('E', 'foo', 'target'),
+            ])
+
+    def test_instance_uses_class_tracer(self):
+        Example.method.set_tracer(self.tracer)
+        try:
+            Example().method()
+        finally:
+            Example.method.set_tracer(None)
+
+        self.assertEqual(phases(self.tracer), [
+            ('B', 'method', 'target'), ('E', 'method', 'target')])
+
+    def test_instance_callbacks_use_class_tracer(self):
+        Example.method.set_tracer(self.tracer)
+        Example.method.add_pre_callback(callback, label='cls')
+        try:
+            e = Example()
+            e.method.add_pre_callback(callback, label='inst')
+            e.method.add_post_callback(callback, label='inst_post')
+            e.method()
+        finally:
+            Example.method.set_tracer(None)
+            Example.method.remove_callbacks()
+
+        self.assertEqual(phases(self.tracer), [
+            ('B', 'inst', 'pre'), ('E', 'inst', 'pre'),
+            ('B', 'cls', 'pre'), ('E', 'cls', 'pre'),
+            ('B', 'method', 'target'), ('E', 'method', 'target'),
+            ('B', 'inst_post', 'post'), ('E', 'inst_post', 'post'),
+            ])
+
+    def test_chrome_trace(self):
+        foo.add_post_callback(callback, label='b')
+        foo.set_tracer(self.tracer)
+        foo(1)
+
+        trace = self.tracer.to_chrome_trace()
+        events = trace['traceEvents']
+        self.assertEqual([e['ph'] for e in events], ['B', 'E', 'B', 'E'])
+        self.assertEqual(events[2]['name'], 'b')
+        self.assertEqual(events[2]['cat'], 'post')
+        self.assertEqual(events[2]['args'], {'priority': 0.0})
+        self.assertEqual(events[2]['pid'], os.getpid())
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'trace.json')
+            self.tracer.write(path)
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)['traceEvents']), 4)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_bad_capacity(self):
+        self.assertRaises(ValueError, Tracer, capacity=0)